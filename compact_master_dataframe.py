@@ -0,0 +1,15 @@
+"""compact_master_dataframe.py
+Utility script to merge the segments the master dataframe is stored in into a single base file,
+which keeps reads fast as the number of contest updates grows. Safe to run at any time, including
+from a cron job.
+"""
+
+from gph_storage.store import open_store
+from gph_utils.gph_config import LOG_NAME
+from gph_utils.gph_logging import log_message
+
+log_message('Compacting master dataframe', log=LOG_NAME)
+
+open_store().compact()
+
+log_message('Master dataframe successfully compacted', log=LOG_NAME)
@@ -0,0 +1,75 @@
+"""contest_progress.py
+Each contest's progress over time: every player's score in the contest's target at every update,
+kept as a small CSV next to the contest's datafile with a row per player and a column per update.
+It's updated by data_updater.update_entry(), so the contest scripts can graph the top players'
+progress without reading the master dataframe.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+from gph_storage.base import SnapshotStore, write_atomic
+
+
+def progress_name(contest_datafile: str) -> str:
+    """Returns the name of the progress file kept alongside a contest's datafile."""
+    return contest_datafile[:-4] + '-progress.csv'
+
+
+class ContestProgress:
+    """Matrix of a contest's players' scores, indexed by RSN with one int column per update number.
+    Players without a score at an update are NA.
+    """
+    def __init__(self, contest_datafile: str):
+        self.filename = progress_name(contest_datafile)
+        if os.path.exists(self.filename):
+            matrix = pd.read_csv(self.filename, index_col='RSN')
+            matrix.columns = matrix.columns.astype(int)
+            self.matrix = matrix.astype('Int64')
+        else:
+            self.matrix = pd.DataFrame(index=pd.Index([], name='RSN', dtype=object))
+
+    def seed(self, store: SnapshotStore, source_id: str, rsns: list, target: str) -> None:
+        """Fills in the updates made before the progress file existed from the master dataframe,
+        for contests that were already running when it was introduced.
+
+        :param store: SnapshotStore holding the master dataframe.
+        :param source_id: str contest ID the updates were made for.
+        :param rsns: list of str OSRS usernames in the contest.
+        :param target: str column of the contest's target.
+        """
+        series = store.series(source_id, rsns, target)
+        self.matrix = series.T.rename_axis(index='RSN', columns=None).astype('Int64')
+
+    def record(self, update_number: int, scores: pd.Series) -> None:
+        """Adds the scores from an update, replacing any already recorded for that update number.
+
+        :param update_number: int update the scores are from.
+        :param scores: pd.Series of int scores indexed by RSN.
+        """
+        scores = scores.astype('Int64')
+        index = self.matrix.index.append(scores.index.difference(self.matrix.index, sort=False))
+        self.matrix = self.matrix.reindex(index).rename_axis('RSN')
+        self.matrix[update_number] = scores
+        self.matrix = self.matrix.reindex(columns=sorted(self.matrix.columns))
+
+    def save(self) -> None:
+        write_atomic(self.matrix, self.filename, lambda df, path: df.to_csv(path))
+
+    def graph_data(self, rsns: list, update_number: int) -> list:
+        """Makes the data for gph_graphing.make_graph() showing several players' progress.
+
+        :param rsns: list of str OSRS usernames to graph.
+        :param update_number: int latest update to graph.
+        :return: 2D list, the first item being rsns and the rest being each player's gains at every
+        update from 0 to update_number. Updates a player wasn't scored at carry their last score
+        forward.
+        """
+        progress = self.matrix.reindex(index=rsns, columns=range(update_number + 1)).astype('float64')
+        progress = progress.ffill(axis=1)
+        first = progress.bfill(axis=1).iloc[:, 0].to_numpy()
+        return [list(rsns)] + (progress.to_numpy() - first[:, np.newaxis]).tolist()
+
+    def missing(self, rsns: list) -> list:
+        """Returns which of rsns have no scores recorded, for instance after a name change."""
+        return [rsn for rsn in rsns if rsn not in self.matrix.index or self.matrix.loc[rsn].isna().all()]
@@ -6,71 +6,312 @@ between contests.
 
 On update/end, loads from CSV and updates entries, as well as computing each
 player's competition progress. Additionally, appends a row to the master dataframe.
+
+Rows are added to the master dataframe through its snapshot store (see gph_storage), so
+an update never has to read or rewrite the existing history.
 """
+import numpy as np
 import hs_wrapper as hs
 import pandas as pd
 
+from time import perf_counter
 from datetime import *
 from gph_utils.gph_config import *
 from gph_utils.gph_logging import log_message
+from gph_storage.base import SnapshotStore, SNAPSHOT_COLUMNS, SPARSE_COLUMNS, timestamps_to_epoch
+from gph_storage.latest import LatestSnapshots
+from gph_storage.store import open_store
+from contest_progress import ContestProgress
+from poll_scheduler import PollScheduler
+from snapshot_cache import SnapshotCache
 
 
 """Used for updating the master_dataframe"""
-master_colnames = ['Timestamp', 'Update number', 'Update source', 'RSN'] + hs.SKILLS + hs.ACTIVITIES + hs.BOSSES
+master_colnames = SNAPSHOT_COLUMNS
+
+"""Compact dtypes the master dataframe is loaded with by load_master_dataframe(). Overall XP can
+exceed 2^32, so it needs a uint64.
+"""
+master_dtypes = {'Update number': 'uint32', 'Update source': 'category', 'RSN': 'category',
+                 **{entry: 'uint32' for entry in hs.ENTRIES}, 'overall': 'uint64'}
+
+
+class SnapshotBatch:
+    """Collects the rows an update adds to the master dataframe in preallocated arrays, so they're
+    turned into a DataFrame once at the end rather than growing one a row at a time.
+    """
+    def __init__(self, update_number: int, source_id: str, capacity=64):
+        """
+        :param update_number: int update number every row in the batch is marked with.
+        :param source_id: str update source every row in the batch is marked with.
+        :param capacity: int number of rows to allocate space for. Grows as needed.
+        """
+        self.update_number = update_number
+        self.source_id = source_id
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((capacity, len(hs.ENTRIES)), dtype=np.int64)
+        self.rsns = []
+
+    def __len__(self) -> int:
+        return len(self.rsns)
+
+    def add(self, rsn: str, usr: hs.HiscoresEntry, timestamp=None) -> None:
+        """Adds a row for a player's snapshot, with entries that are not found set to zero.
+
+        :param rsn: String of player's OSRS username.
+        :param usr: HiscoresEntry fetched for the player.
+        :param timestamp: int epoch time the snapshot was taken. Defaults to when usr was fetched,
+        or now if it was just fetched.
+        @:raises ValueError if the snapshot doesn't have a value for every entry in hs.ENTRIES
+        """
+        if len(usr.values) != len(hs.ENTRIES):
+            raise ValueError(f'Expected {len(hs.ENTRIES)} highscores entries, got {len(usr.values)}')
+        size = len(self.rsns)
+        if size == len(self.timestamps):
+            # Double the space allocated, so adding n rows only copies O(n) values in total
+            capacity = max(2 * size, 1)
+            self.timestamps = np.resize(self.timestamps, capacity)
+            self.values = np.resize(self.values, (capacity, len(hs.ENTRIES)))
+        if timestamp is None:
+            timestamp = int(usr.fetched_at if usr.fetched_at is not None else datetime.now().timestamp())
+        self.timestamps[size] = timestamp
+        np.maximum(usr.values, 0, out=self.values[size])
+        self.rsns.append(rsn)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns the batch's rows as a DataFrame with columns matching master_colnames."""
+        size = len(self.rsns)
+        df = pd.DataFrame(self.values[:size], columns=hs.ENTRIES)
+        df.insert(0, 'Timestamp', self.timestamps[:size])
+        df.insert(1, 'Update number', np.full(size, self.update_number, dtype=np.int64))
+        df.insert(2, 'Update source', self.source_id)
+        df.insert(3, 'RSN', pd.Series(self.rsns, dtype=object))
+        return df
+
+
+def load_master_dataframe(columns=None, sources=None, sparse=False, store=None, logfile=LOG_NAME) -> pd.DataFrame:
+    """Loads the master dataframe with compact dtypes: categories for RSN and update source,
+    unsigned ints for highscores values and int epoch times for timestamps. Highscores values are
+    unsigned, so cast them to a signed type before subtracting them to get gains.
+
+    :param columns: list of str columns to load. Defaults to all of master_colnames.
+    :param sources: list of str update sources to load rows for. Defaults to every source.
+    :param sparse: bool, if True boss and activity columns are returned as sparse columns.
+    :param store: SnapshotStore to load from. Defaults to the store returned by open_store().
+    :param logfile: str denoting where to write log messages.
+    :return: pd.DataFrame of the requested columns.
+    """
+    start = perf_counter()
+    if store is None:
+        store = open_store()
+    df = store.load(columns=columns, sources=sources)
+
+    dtypes = {}
+    for column in df.columns:
+        if column in SPARSE_COLUMNS and sparse:
+            dtypes[column] = pd.SparseDtype(master_dtypes[column], 0)
+        elif column in master_dtypes:
+            dtypes[column] = master_dtypes[column]
+    # Unranked entries are stored as 0, so clamp anything negative before making them unsigned
+    entries = [column for column in df.columns if column in hs.ENTRIES]
+    df[entries] = df[entries].clip(lower=0)
+    df = df.astype(dtypes)
+    if 'Timestamp' in df.columns:
+        df['Timestamp'] = timestamps_to_epoch(df['Timestamp'])
+
+    log_message(f'Loaded {len(df.index)} master dataframe rows ({df.memory_usage(deep=True).sum() / 2 ** 20:.1f} MiB) '
+                f'in {perf_counter() - start:.2f}s', log=logfile)
+    return df
+
+
+def fetch_users(users: list, source_id: str, logfile=LOG_NAME, workers=FETCH_WORKERS, use_cache=True) -> list:
+    """Fetches highscores entries for a list of players concurrently. Snapshots already fetched
+    within the last SNAPSHOT_CACHE_MINUTES (by any source) are reused rather than fetched again.
+
+    :param users: list of str RSNs to fetch.
+    :param source_id: str identifying the source fetching the players, recorded in the snapshot cache.
+    :param logfile: str denoting where to write log messages.
+    :param workers: int maximum number of requests to have in flight at once. Defaults to
+    FETCH_WORKERS set in gph_config.py
+    :param use_cache: bool, if False every player is fetched fresh, although the snapshots are still
+    cached for other sources to reuse.
+    :return: list of (rsn, HiscoresEntry) tuples in the same order as users. The HiscoresEntry
+    is None for any player who was not found on the highscores, and hs.FETCH_FAILED for any player
+    who could not be fetched.
+    """
+    cache = SnapshotCache()
+    fetched = cache.get_many(users) if use_cache else {}
+    misses = [rsn for rsn in users if rsn not in fetched]
+    if misses:
+        new_entries = hs.get_users(misses, connections=workers)
+        cache.put_many({rsn: entry for rsn, entry in new_entries.items()
+                        if isinstance(entry, hs.HiscoresEntry)}, source_id)
+        fetched.update(new_entries)
+
+    log_message(f'Snapshot cache: {cache.hits} hits, {cache.misses} misses for source {source_id}', log=logfile)
+    return [(rsn, fetched[rsn]) for rsn in users]
+
+
+def record_progress(df: pd.DataFrame, update_number: int, store: SnapshotStore, target: str,
+                    contest_datafile: str, source_id: str) -> None:
+    """Adds every player's current score to the contest's progress file (see contest_progress.py).
+    Players that weren't polled this update carry their previous score.
+
+    :param df: pd.DataFrame contest dataframe, with each player's 'Current' score.
+    :param update_number: int update the scores are from.
+    :param store: SnapshotStore holding the master dataframe, used to fill in earlier updates if the
+    contest started before it had a progress file.
+    :param target: str column of the contest's target.
+    :param contest_datafile: str denoting the .csv file where the contest_dataframe is saved.
+    :param source_id: str contest ID the updates are made for.
+    """
+    progress = ContestProgress(contest_datafile)
+    # Multi-target contests have always had a progress file, and their scores aren't a single column
+    if progress.matrix.empty and update_number > 0 and target in SNAPSHOT_COLUMNS:
+        progress.seed(store, source_id, df['RSN'].tolist(), target)
+    progress.record(update_number, df.set_index('RSN')['Current'])
+    progress.save()
+
+
+def target_scores(fetched, game_mode: str, target: str, multi_targets=None, logfile=LOG_NAME) -> dict:
+    """Reads every fetched player's score in a contest's target at once, from one array of their
+    highscores entries.
+
+    :param fetched: iterable of (RSN, HiscoresEntry) pairs as yielded by fetch_users(). Players that
+    weren't found or couldn't be fetched are skipped.
+    :param game_mode: str in {'skill', 'boss', 'activity', 'multi'} denoting the type of target.
+    :param target: str in hs.SKILLS, hs.BOSSES or hs.ACTIVITIES denoting the specific target, or
+    'multi' for a multi-target contest.
+    :param multi_targets: dict mapping highscores entries to their weights. Only used when game_mode ==
+    'multi', in which case each player's score is the weighted sum of those entries.
+    :param logfile: str denoting where to write log messages.
+    :return: dict mapping each RSN to their int score. Unranked entries are -1, as on the highscores.
+    """
+    users = [(rsn, usr) for rsn, usr in fetched if usr is not None and usr is not hs.FETCH_FAILED]
+    rsns = [rsn for rsn, _ in users]
+    targets = {'skill': hs.SKILLS, 'activity': hs.ACTIVITIES, 'boss': hs.BOSSES}
+    if game_mode == 'multi':
+        scores = hs.query_weighted_scores([usr for _, usr in users], hs.weight_vector(multi_targets))
+    elif game_mode in targets:
+        if target not in targets[game_mode]:
+            print(f'{target} not found!\n')
+            raise AttributeError(target)
+        column = hs.ENTRIES.index(target)
+        scores = np.array([usr.values[column] for _, usr in users], dtype=np.int64)
+    else:
+        log_message(f'Target {target} not recognized', log=logfile)
+        return {}
+    return dict(zip(rsns, scores.tolist()))
+
+
+def refresh_standings(df: pd.DataFrame, scores: dict, update_mode: str) -> pd.DataFrame:
+    """Updates a contest dataframe with freshly fetched scores and ranks it, for every player at once.
+
+    Players whose score has dropped below their starting score keep their starting score (or at the end
+    of a contest, players with a score below 50), which preserves any manual edits made to the contest
+    data in the case that a user's score was too low to appear on the highscores. Players without a
+    fresh score keep their previous one.
+
+    :param df: pd.DataFrame contest dataframe with columns 'RSN', 'Start', 'Current' and 'Gained'.
+    :param scores: dict mapping RSNs to their freshly fetched int scores, as returned by target_scores().
+    :param update_mode: str in {'update', 'end'} denoting which contest script is calling the update.
+    :return: pd.DataFrame of the contest dataframe ranked by gains (see rank_standings()).
+    """
+    df = df.copy()
+    fresh = df['RSN'].map(scores)
+    fetched = fresh.notna().to_numpy()
+    start = df['Start'].to_numpy(dtype=np.int64)
+    score = fresh.fillna(0).to_numpy(dtype=np.int64)
+    if update_mode == 'end':
+        score = np.where(score < 50, start, score)
+    else:
+        score = np.maximum(score, start)
+    df['Current'] = np.where(fetched, score, df['Current'].to_numpy(dtype=np.int64))
+    df['Gained'] = np.where(fetched, score - start, df['Gained'].to_numpy(dtype=np.int64))
+    return rank_standings(df)
+
+
+def rank_standings(df: pd.DataFrame) -> pd.DataFrame:
+    """Sorts a contest dataframe by gains, highest first, keeping players who gained the same amount in
+    their previous order. Sets each player's 'Rank', which tied players share.
+    """
+    df = df.sort_values(by=['Gained'], ascending=False, kind='stable').reset_index(drop=True)
+    df['Rank'] = df['Gained'].rank(method='min', ascending=False).astype(np.int64)
+    return df
+
+
+def contest_leaders(df: pd.DataFrame, n: int) -> list:
+    """Returns the top n players in a ranked contest dataframe as a list of (rank, RSN, gained) tuples."""
+    top = df.iloc[:n]
+    return list(zip(top['Rank'].tolist(), top['RSN'].tolist(), top['Gained'].tolist()))
+
+
+def contest_participants(df: pd.DataFrame, threshold: int, skip=0, limit=None) -> list:
+    """Lists the players in a ranked contest dataframe who have gained at least threshold.
+
+    :param df: pd.DataFrame ranked contest dataframe.
+    :param threshold: int minimum gain to count as a participant.
+    :param skip: int number of top players to leave out, such as the contest's winners.
+    :param limit: int maximum number of players after those skipped to consider. Defaults to everyone.
+    :return: list of str RSNs in rank order.
+    """
+    ranked = df.iloc[skip:] if limit is None else df.iloc[skip:skip + limit]
+    return ranked.loc[ranked['Gained'] >= threshold, 'RSN'].tolist()
 
 
 def update_entry(infile: str, game_mode: str, target: str, update_mode: str,
-                 update_number: int, master_dataframe: pd.DataFrame, logfile: str,
-                 contest_datafile: str, source_id: str):
+                 update_number: int, store: SnapshotStore, logfile: str,
+                 contest_datafile: str, source_id: str, multi_targets=None):
     """Creates and updates both contest and master dataframes
 
     :param infile: str: filename of a .txt file listing the players to track with the contest.
     Only used when update_mode == 'start'. Otherwise can just be passed an empty string.
-    :param game_mode: str in {'skill', 'boss', 'activity'} denoting the type of target to
+    :param game_mode: str in {'skill', 'boss', 'activity', 'multi'} denoting the type of target to
     track.
     :param target: str in hs.SKILLS, hs.BOSSES or hs.ACTIVITIES denoting the specific target
-    to track.
+    to track, or 'multi' for a multi-target contest.
     :param update_mode: str in {'start', 'update', 'end'} denoting which contest script is
     calling the update, as this affects behavior.
     :param update_number: int denoting the number of times the contest has been updated. Used
     to mark rows in master_dataframe (multiple rows with the same RSN value may have the same
     value in the 'Update Number' column. This is okay since it's used relative to a contest
     and not in any absolute context.
-    :param master_dataframe: pd.DataFrame containing a master record of each player in infile's
-    HS pages over time.
+    :param store: SnapshotStore holding the master record of each player in infile's HS pages
+    over time. A row for each player fetched is appended to it.
     :param logfile: str denoting where to write log messages.
     :param contest_datafile: str denoting the .csv file where the contest_dataframe is saved.
     :param source_id: str identifying the source calling the master dataframe to be updated. In most cases,
     this will be a contest_id
+    :param multi_targets: dict mapping highscores entries to their weights. Only used when game_mode ==
+    'multi', in which case each player's score is the weighted sum of those entries.
     :return: pd.DataFrame df: the contest_dataframe
     """
+    # Rows to append to the master dataframe for this update
+    batch = SnapshotBatch(update_number, source_id)
+
     if update_mode == 'start':
         # Expects infile to be a list of users. Parses that list and copies to an array
         with open(infile) as file:
             users = file.readlines()
             users = [line.rstrip() for line in users]
 
-            # Create contest_dataframe with each user's RSN and starting scores
-            df = pd.DataFrame(columns=['RSN', 'Start', 'Current', 'Gained'])
-            for rsn in users:
-                # Fetch Highscores object for user 'rsn'
-                try:
-                    usr = hs.get_user(rsn)
-
+            # Collect each user's RSN and starting scores for the contest_dataframe
+            contest_rows = []
+            scheduler = PollScheduler()
+            # Everyone's starting scores come from a fresh fetch rather than the snapshot cache, since
+            # a stale baseline would inflate everyone's gains
+            fetched = list(fetch_users(users, source_id, logfile, use_cache=False))
+            scores = target_scores(fetched, game_mode, target, multi_targets, logfile)
+            for rsn, usr in fetched:
                 # If user is not found on the highscores, log this and continue
-                except ValueError:
+                if usr is None:
                     log_message(f'User {rsn} not found on highscores', logfile)
                     continue
-
-                # Queries user's highscores entry for target
-                if game_mode == 'skill':
-                    score = int(hs.query_skill_xp(usr, target))
-                elif game_mode == 'activity':
-                    score = int(hs.query_activity_score(usr, target))
-                elif game_mode == 'boss':
-                    score = int(hs.query_boss_kc(usr, target))
-                else:
-                    log_message(f'Target {target} not recognized', logfile)
+                if usr is hs.FETCH_FAILED:
+                    log_message(f'Unable to fetch user {rsn} from the highscores, skipping', logfile)
+                    continue
+                scheduler.record(rsn, usr, now=usr.fetched_at)
+                score = scores.get(rsn, 0)
 
                 # If a player is listed on the highscores but does not have an entry for
                 # target, set their score from -1 to 0
@@ -78,24 +319,24 @@ def update_entry(infile: str, game_mode: str, target: str, update_mode: str,
                     score = 0
 
                 # Add user record to contest dataframe
-                df.loc[len(df.index)] = [rsn, score, score, 0]
+                contest_rows.append([rsn, score, score, 0])
 
                 # Append a row for user in master dataframe
-                hs_entries = hs.get_all_entries(usr)
-                now = datetime.now()
-                timestamp = now.strftime('[%d %b %Y - %H:%M:%S]')
-                entry_array = [timestamp, update_number, source_id, rsn] + hs_entries
                 try:
-                    master_dataframe.loc[len(
-                        master_dataframe)] = entry_array
+                    batch.add(rsn, usr)
                 except ValueError as err:
                     log_message(f'Data error {err} occurred while adding row for {rsn} to master dataframe.')
                     continue
 
-            # Export both dataframes to .csv files
-            master_dataframe.to_csv(MASTER_DF_NAME, index=False)
+            # Save the new master dataframe rows and export the contest dataframe to a .csv file
+            df = pd.DataFrame(contest_rows, columns=['RSN', 'Start', 'Current', 'Gained'])
+            scheduler.save()
+            store.append(batch.to_dataframe())
             df.to_csv(contest_datafile, index=False)
 
+            # Start the contest's progress file with everyone's starting scores
+            record_progress(df, update_number, store, target, contest_datafile, source_id)
+
             # return a pd.DataFrame for contest dataframe so the contest start script
             # can then utilise that information.
             return df
@@ -104,113 +345,96 @@ def update_entry(infile: str, game_mode: str, target: str, update_mode: str,
         # Read contest_dataframe from file
         df = pd.read_csv(contest_datafile)
 
-        for i in range(len(df.index)):
-            rsn = df.at[i, 'RSN']
-            try:
-                usr = hs.get_user(rsn)
-            except ValueError:
+        # Only fetch players who are due to be polled. Idle players keep their previous scores
+        # until they're due again.
+        scheduler = PollScheduler()
+        if not scheduler.state:
+            # Seed the polling state from everyone's latest snapshot rather than the whole history. With
+            # nothing to compare them against, players count as changed at their latest snapshot, so
+            # they're polled until they've been idle for IDLE_AFTER_HOURS.
+            latest = store.latest if store.latest is not None else LatestSnapshots()
+            snapshots = latest.read(columns=hs.ENTRIES)
+            if snapshots.empty:
+                snapshots = load_master_dataframe(columns=['Timestamp', 'RSN'] + hs.ENTRIES, store=store,
+                                                  logfile=logfile)
+            scheduler.rebuild(snapshots)
+        rsns = df['RSN'].tolist()
+        due = scheduler.due(rsns)
+        log_message(f'Polling {len(due)} of {len(rsns)} players, skipping {len(rsns) - len(due)} idle players.',
+                    log=logfile)
+        fetched = dict(fetch_users(due, source_id, logfile))
+
+        for rsn in rsns:
+            if rsn not in fetched:
+                continue
+            usr = fetched[rsn]
+            if usr is None:
                 # If a RSN that's already in the contest dataframe isn't found, they likely
                 # changed their name, so flag this in the log so their new name can be
                 # edited into the datafile
                 log_message(f'User {rsn} not found! Potential name change detected!',
                             log=logfile)
                 continue
-
-            # This line is mostly just present to prevent an IDE warning since
-            # if score is not defined below, the update can't run
-            score = 0
-
-            # Queries user's highscores entry for target
-            prev = int(df.at[i, 'Start'])
-            if game_mode == 'skill':
-                score = int(hs.query_skill_xp(usr, target))
-            elif game_mode == 'activity':
-                score = int(hs.query_activity_score(usr, target))
-            elif game_mode == 'boss':
-                score = int(hs.query_boss_kc(usr, target))
-            else:
-                log_message(f'Target {target} not recognized', log=logfile)
-
-            # Preserve any manual edits made to the contest data in the case that a user's
-            # score was too low to appear on the highscores
-            if score < prev:
-                score = prev
-
-            # Calculate user's progress and update their row in the contest dataframe
-            gained = int(score) - int(prev)
-            df.at[i, 'Current'] = score
-            df.at[i, 'Gained'] = gained
+            if usr is hs.FETCH_FAILED:
+                # The highscores couldn't be reached for this player, so keep their previous
+                # score until the next update
+                log_message(f'Unable to fetch user {rsn} from the highscores, skipping this update',
+                            log=logfile)
+                continue
+            scheduler.record(rsn, usr, now=usr.fetched_at)
 
             # Append a row for user in master dataframe with their updated highscores entries
-            hs_entries = hs.get_all_entries(usr)
-            now = datetime.now()
-            timestamp = now.strftime('[%d %b %Y - %H:%M:%S]')
-            entry_array = [timestamp, update_number, source_id, rsn] + hs_entries
-            master_dataframe.loc[len(
-                master_dataframe)] = entry_array
+            batch.add(rsn, usr)
 
-        # Rank the rows in contest dataframe and reset indices.
-        df = df.sort_values(by=['Gained'], ascending=False).reset_index(drop=True)
+        scheduler.save()
 
-        # Pass pd.DataFrames for master dataframe and contest dataframe back to the contest
+        # Update and rank everyone's scores in the contest dataframe at once
+        df = refresh_standings(df, target_scores(fetched.items(), game_mode, target, multi_targets, logfile),
+                               update_mode)
+        record_progress(df, update_number, store, target, contest_datafile, source_id)
+
+        # Save the new master dataframe rows and pass the contest dataframe back to the contest
         # update script.
-        return master_dataframe, df
+        store.append(batch.to_dataframe())
+        return df
 
     elif update_mode == 'end':
         # Read contest dataframe from file
         df = pd.read_csv(contest_datafile)
 
-        for i in range(len(df.index)):
-            rsn = df.at[i, 'RSN']
-            try:
-                usr = hs.get_user(rsn)
-            except ValueError:
+        # Everyone is polled at the end of a contest, regardless of whether they're idle
+        scheduler = PollScheduler()
+        # Final standings always come from a fresh fetch rather than the snapshot cache
+        fetched = list(fetch_users(df['RSN'].tolist(), source_id, logfile, use_cache=False))
+        for rsn, usr in fetched:
+            if usr is None:
                 # If a RSN that's already in the contest dataframe isn't found, they likely
                 # changed their name, so flag this in the log so their new name can be
                 # edited into the datafile
                 log_message(f'User {rsn} not found! Potential name change detected!',
                             log=logfile)
                 continue
-
-            # This line is mostly just present to prevent an IDE warning since
-            # if score is not defined below, the update can't run
-            score = 0
-
-            # Queries user's highscores entry for target
-            prev = int(df.at[i, 'Start'])
-            if game_mode == 'skill':
-                score = int(hs.query_skill_xp(usr, target))
-            elif game_mode == 'activity':
-                score = int(hs.query_activity_score(usr, target))
-            elif game_mode == 'boss':
-                score = int(hs.query_boss_kc(usr, target))
-            else:
-                log_message(f'Target {target} not recognized', log=logfile)
-
-            # Preserve any manual edits made to the contest data in the case that a user's
-            # score was too low to appear on the highscores
-            if score < 50:
-                score = prev
-
-            # Calculate user's progress and update their row in the contest dataframe
-            gained = int(score) - int(prev)
-            df.at[i, 'Current'] = score
-            df.at[i, 'Gained'] = gained
+            if usr is hs.FETCH_FAILED:
+                # The highscores couldn't be reached for this player, so keep their previous
+                # score until the next update
+                log_message(f'Unable to fetch user {rsn} from the highscores, skipping this update',
+                            log=logfile)
+                continue
+            scheduler.record(rsn, usr, now=usr.fetched_at)
 
             # Append a row for user in master dataframe with their updated highscores entries
-            hs_entries = hs.get_all_entries(usr)
-            now = datetime.now()
-            timestamp = now.strftime('[%d %b %Y - %H:%M:%S]')
-            entry_array = [timestamp, update_number, source_id, rsn] + hs_entries
-            master_dataframe.loc[len(
-                master_dataframe)] = entry_array
+            batch.add(rsn, usr)
+
+        scheduler.save()
 
-        # Rank the rows in contest dataframe and reset indices.
-        df = df.sort_values(by=['Gained'], ascending=False).reset_index(drop=True)
+        # Update and rank everyone's scores in the contest dataframe at once
+        df = refresh_standings(df, target_scores(fetched, game_mode, target, multi_targets, logfile), update_mode)
+        record_progress(df, update_number, store, target, contest_datafile, source_id)
 
-        # Pass pd.DataFrames for master dataframe and contest dataframe back to the contest
+        # Save the new master dataframe rows and pass the contest dataframe back to the contest
         # update script.
-        return master_dataframe, df
+        store.append(batch.to_dataframe())
+        return df
 
     else:
         log_message(f'Update mode "{update_mode}" not recognized', log=logfile)
@@ -0,0 +1,48 @@
+"""delta_report.py
+Utility script to report how much delta encoding (see gph_storage/delta.py) would shrink a master
+dataframe CSV, and to check that it decodes back to the same rows.
+
+@:arg --input: str Name of the master dataframe CSV to encode. Default value: MASTER_DF_NAME set in gph_config.py
+@:arg --keyframe_interval: int Number of a player's rows between each full keyframe. Default value: DELTA_KEYFRAME_INTERVAL
+
+Example call:
+
+"python delta_report.py --input 'master_dataframe.csv' --keyframe_interval 28"
+"""
+
+import os
+import io
+import argparse
+import numpy as np
+import pandas as pd
+from gph_storage.base import timestamps_to_epoch
+from gph_storage.delta import encode_deltas, decode_deltas
+from gph_utils.gph_config import *
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--input', type=str, default=MASTER_DF_NAME, help='Name of the master dataframe CSV to encode.')
+parser.add_argument('--keyframe_interval', type=int, default=DELTA_KEYFRAME_INTERVAL,
+                    help='Number of a player\'s rows between each full keyframe.')
+
+args = parser.parse_args()
+
+master_df = pd.read_csv(args.input)
+encoded = encode_deltas(master_df, keyframe_interval=args.keyframe_interval)
+
+buffer = io.BytesIO()
+np.savez_compressed(buffer, **encoded)
+csv_size = os.path.getsize(args.input)
+delta_size = buffer.getbuffer().nbytes
+
+cells = len(master_df.index) * len(encoded['entries'])
+stored = encoded['keyframe_values'].size + len(encoded['change_values'])
+decoded = decode_deltas(encoded)
+# Timestamps are decoded as epoch times
+matches = decoded[master_df.columns].equals(master_df.assign(Timestamp=timestamps_to_epoch(master_df['Timestamp'])))
+
+print(f'Rows: {len(master_df.index):,} ({len(encoded["rsns"]):,} players)')
+print(f'Keyframes: {len(encoded["keyframe_rows"]):,}, changed values: {len(encoded["change_values"]):,}')
+print(f'Values stored: {stored:,} of {cells:,} ({stored / max(cells, 1):.1%})')
+print(f'CSV size: {csv_size:,} bytes')
+print(f'Delta encoded size: {delta_size:,} bytes ({csv_size / max(delta_size, 1):.1f}x smaller)')
+print(f'Decodes to the same rows: {matches}')
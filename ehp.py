@@ -0,0 +1,172 @@
+"""ehp.py
+Efficient hours played (EHP): how long a player's XP would take to gain at efficient rates, the
+skilling counterpart of the EHB calculated in hs_wrapper.py. Rates change as a player unlocks better
+training methods, so each skill's rates are split into XP brackets, and a player's EHP in a skill is
+the time taken to gain their XP through each bracket in turn.
+
+Rates are approximately those listed at https://wiseoldman.net/rates/ehp
+"""
+import numpy as np
+import hs_wrapper as hs
+
+"""Skills that count toward EHP, index matched with the columns calc_ehp_batch() takes"""
+EHP_SKILLS = hs.SKILLS[1:]
+
+"""MAIN_EHP_RATES and IRON_EHP_RATES:
+    Dicts of skills and their XP per efficient hour in each XP bracket, for main and ironman accounts.
+    Each skill maps to a list of (start XP, XP per hour) tuples in increasing order of start XP, the
+    first starting at 0 XP. The last bracket's rate applies up to max XP.
+    A rate value of -1.0 indicates XP in that skill does not count toward EHP, such as hitpoints,
+    which is gained alongside the other combat skills.
+    """
+MAIN_EHP_RATES = {'attack': [(0, 15000.0), (37224, 38000.0), (101333, 55000.0), (273742, 65000.0),
+                             (737627, 75000.0), (1986068, 85000.0), (5346332, 95000.0), (13034431, 100000.0)],
+                  'defence': [(0, 15000.0), (37224, 38000.0), (101333, 55000.0), (273742, 65000.0),
+                              (737627, 75000.0), (1986068, 85000.0), (5346332, 95000.0), (13034431, 100000.0)],
+                  'strength': [(0, 15000.0), (37224, 38000.0), (101333, 55000.0), (273742, 65000.0),
+                               (737627, 75000.0), (1986068, 85000.0), (5346332, 95000.0), (13034431, 100000.0)],
+                  'hitpoints': [(0, -1.0)],
+                  'ranged': [(0, 50000.0), (6517, 150000.0), (37224, 250000.0), (737627, 450000.0)],
+                  'prayer': [(0, 1000000.0)],
+                  'magic': [(0, 30000.0), (13363, 150000.0), (101333, 250000.0)],
+                  'cooking': [(0, 40000.0), (7842, 130000.0), (37224, 175000.0), (737627, 490000.0)],
+                  'woodcutting': [(0, 7000.0), (2411, 16000.0), (13363, 35000.0), (41171, 50000.0),
+                                  (302288, 70000.0), (737627, 85000.0), (1986068, 95000.0), (5902831, 110000.0)],
+                  'fletching': [(0, 40000.0), (969, 100000.0), (33648, 250000.0), (50339, 1000000.0),
+                                (150872, 2000000.0)],
+                  'fishing': [(0, 14000.0), (4470, 30000.0), (13363, 40000.0), (273742, 65000.0),
+                              (737627, 75000.0), (2421087, 85000.0), (5902831, 90000.0)],
+                  'firemaking': [(0, 45000.0), (13363, 132660.0), (61512, 198990.0), (273742, 298485.0),
+                                 (1210421, 447801.0)],
+                  'crafting': [(0, 45000.0), (13363, 150000.0), (101333, 360000.0)],
+                  'smithing': [(0, 40000.0), (37224, 129000.0), (605032, 300000.0)],
+                  'mining': [(0, 8000.0), (14833, 20000.0), (41171, 44000.0), (302288, 64000.0),
+                             (737627, 77000.0), (1986068, 92000.0), (5902831, 97000.0)],
+                  'herblore': [(0, 60000.0), (27473, 200000.0), (2192818, 450000.0)],
+                  'agility': [(0, 6000.0), (13363, 15000.0), (41171, 44000.0), (449428, 50000.0),
+                              (2192818, 55000.0), (6000000, 60000.0), (11805606, 65000.0)],
+                  'thieving': [(0, 15000.0), (61, 60000.0), (13363, 100000.0), (273742, 220000.0),
+                               (1986068, 255000.0), (5902831, 265000.0)],
+                  'slayer': [(0, 5000.0), (37224, 12000.0), (100000, 17000.0), (1000000, 25000.0),
+                             (1986068, 30000.0), (3000000, 32500.0), (7195629, 35000.0)],
+                  'farming': [(0, 10000.0), (2411, 50000.0), (13363, 80000.0), (61512, 150000.0),
+                              (273742, 350000.0), (1210421, 1500000.0)],
+                  'runecraft': [(0, 8000.0), (2107, 20000.0), (101333, 45000.0), (1210421, 48000.0),
+                                (2421087, 55000.0), (5346332, 65000.0)],
+                  'hunter': [(0, 5000.0), (12031, 40000.0), (247886, 80000.0), (1986068, 110000.0),
+                             (3972294, 135000.0)],
+                  'construction': [(0, 20000.0), (18247, 100000.0), (123660, 230000.0), (605032, 450000.0),
+                                   (4385776, 550000.0)]}
+
+IRON_EHP_RATES = {'attack': [(0, 15000.0), (37224, 38000.0), (101333, 55000.0), (273742, 60000.0),
+                             (737627, 70000.0), (1986068, 80000.0), (5346332, 90000.0), (13034431, 95000.0)],
+                  'defence': [(0, 15000.0), (37224, 38000.0), (101333, 55000.0), (273742, 60000.0),
+                              (737627, 70000.0), (1986068, 80000.0), (5346332, 90000.0), (13034431, 95000.0)],
+                  'strength': [(0, 15000.0), (37224, 38000.0), (101333, 55000.0), (273742, 60000.0),
+                               (737627, 70000.0), (1986068, 80000.0), (5346332, 90000.0), (13034431, 95000.0)],
+                  'hitpoints': [(0, -1.0)],
+                  'ranged': [(0, 50000.0), (6517, 120000.0), (37224, 200000.0), (737627, 350000.0)],
+                  'prayer': [(0, 70000.0), (737627, 250000.0)],
+                  'magic': [(0, 30000.0), (13363, 90000.0), (101333, 150000.0)],
+                  'cooking': [(0, 40000.0), (7842, 120000.0), (37224, 160000.0), (737627, 300000.0)],
+                  'woodcutting': [(0, 7000.0), (2411, 16000.0), (13363, 35000.0), (41171, 50000.0),
+                                  (302288, 70000.0), (737627, 85000.0), (1986068, 95000.0), (5902831, 110000.0)],
+                  'fletching': [(0, 30000.0), (969, 60000.0), (33648, 150000.0), (273742, 250000.0)],
+                  'fishing': [(0, 14000.0), (4470, 30000.0), (13363, 40000.0), (273742, 60000.0),
+                              (737627, 70000.0), (2421087, 80000.0), (5902831, 85000.0)],
+                  'firemaking': [(0, 45000.0), (13363, 132660.0), (61512, 198990.0), (273742, 298485.0),
+                                 (1210421, 447801.0)],
+                  'crafting': [(0, 30000.0), (13363, 70000.0), (101333, 130000.0)],
+                  'smithing': [(0, 30000.0), (37224, 50000.0), (605032, 100000.0)],
+                  'mining': [(0, 8000.0), (14833, 20000.0), (41171, 44000.0), (302288, 64000.0),
+                             (737627, 77000.0), (1986068, 92000.0), (5902831, 97000.0)],
+                  'herblore': [(0, 30000.0), (27473, 60000.0), (2192818, 80000.0)],
+                  'agility': [(0, 6000.0), (13363, 15000.0), (41171, 44000.0), (449428, 50000.0),
+                              (2192818, 55000.0), (6000000, 60000.0), (11805606, 65000.0)],
+                  'thieving': [(0, 15000.0), (61, 60000.0), (13363, 100000.0), (273742, 200000.0),
+                               (1986068, 240000.0), (5902831, 250000.0)],
+                  'slayer': [(0, 5000.0), (37224, 12000.0), (100000, 17000.0), (1000000, 25000.0),
+                             (1986068, 30000.0), (3000000, 32500.0), (7195629, 35000.0)],
+                  'farming': [(0, 10000.0), (2411, 40000.0), (13363, 60000.0), (61512, 100000.0),
+                              (273742, 200000.0), (1210421, 400000.0)],
+                  'runecraft': [(0, 8000.0), (2107, 20000.0), (101333, 35000.0), (1210421, 40000.0),
+                                (2421087, 45000.0), (5346332, 50000.0)],
+                  'hunter': [(0, 5000.0), (12031, 40000.0), (247886, 80000.0), (1986068, 110000.0),
+                             (3972294, 135000.0)],
+                  'construction': [(0, 20000.0), (18247, 60000.0), (123660, 120000.0), (605032, 200000.0)]}
+
+"""Width of the range of XP values each skill's brackets are offset into. Max XP is 200M, so each
+skill's brackets fit below the next skill's.
+"""
+_SKILL_STRIDE = 1 << 31
+
+
+def _compile_rates(rate_tables: list) -> tuple:
+    """Flattens bracketed rate tables into arrays that every skill of every player can be looked up
+    in with a single searchsorted.
+
+    :param rate_tables: list of dicts mapping each of EHP_SKILLS to its brackets, one per account type.
+    :return: tuple of np.ndarrays: each bracket's start XP offset by its table and skill's position,
+    its start XP, the hours taken to reach its start from 0 XP, and its hours per XP.
+    """
+    starts, offset_starts, hours, hours_per_xp = [], [], [], []
+    for table_number, rate_table in enumerate(rate_tables):
+        for skill_number, skill in enumerate(EHP_SKILLS):
+            offset = (table_number * len(EHP_SKILLS) + skill_number) * _SKILL_STRIDE
+            total_hours = 0.0
+            brackets = rate_table[skill]
+            for i, (start, rate) in enumerate(brackets):
+                # XP in skills that don't count toward EHP takes no time
+                rate_hours = 1.0 / rate if rate > 0 else 0.0
+                starts.append(start)
+                offset_starts.append(offset + start)
+                hours.append(total_hours)
+                hours_per_xp.append(rate_hours)
+                if i + 1 < len(brackets):
+                    total_hours += (brackets[i + 1][0] - start) * rate_hours
+    return (np.array(offset_starts, dtype=np.int64), np.array(starts, dtype=np.int64),
+            np.array(hours, dtype=np.float64), np.array(hours_per_xp, dtype=np.float64))
+
+
+_OFFSET_STARTS, _STARTS, _HOURS, _HOURS_PER_XP = _compile_rates([MAIN_EHP_RATES, IRON_EHP_RATES])
+
+
+def hours_at(xp: np.ndarray, iron: np.ndarray) -> np.ndarray:
+    """Calculates how many efficient hours it takes to reach some XP in each skill from 0 XP.
+
+    :param xp: 2D array of XP, with a row per player and a column per skill in EHP_SKILLS. Negative
+    values, as given for skills a player isn't ranked in, are treated as 0 XP.
+    :param iron: 1D bool array, True for each player that's any type of ironman.
+    :return: np.ndarray of hours, the same shape as xp.
+    """
+    xp = np.clip(np.asarray(xp, dtype=np.int64), 0, _SKILL_STRIDE - 1)
+    table = np.asarray(iron, dtype=np.int64)[:, np.newaxis] * len(EHP_SKILLS) + np.arange(len(EHP_SKILLS))
+    brackets = np.searchsorted(_OFFSET_STARTS, xp + table * _SKILL_STRIDE, side='right') - 1
+    return _HOURS[brackets] + (xp - _STARTS[brackets]) * _HOURS_PER_XP[brackets]
+
+
+def calc_ehp_batch(rsns: list, start_xp: np.ndarray, end_xp: np.ndarray, account_types=None) -> np.ndarray:
+    """Calculates the efficient hours played that many players gained between two snapshots.
+
+    :param rsns: list of str OSRS usernames.
+    :param start_xp: 2D array-like of each player's XP at the start, with a row per player in rsns
+    and a column per skill in EHP_SKILLS.
+    :param end_xp: 2D array-like of each player's XP at the end, in the same layout as start_xp.
+    :param account_types: hs.AccountTypeStore to read players' account types from. Defaults to the
+    store saved at ACCOUNT_TYPES_NAME. Does not make any highscores requests.
+    :return: np.ndarray of each player's EHP gained, rounded to 2 decimal places, or -1.0 for players
+    whose account type isn't known.
+    """
+    if account_types is None:
+        account_types = hs.AccountTypeStore()
+    iron = [account_types.is_iron(rsn) for rsn in rsns]
+    for rsn, player_iron in zip(rsns, iron):
+        if player_iron is None:
+            print(f'Account type for user {rsn} not known!')
+    known = np.array([player_iron is not None for player_iron in iron], dtype=bool)
+    iron = np.array([bool(player_iron) for player_iron in iron], dtype=bool)
+
+    start_xp = np.asarray(start_xp, dtype=np.int64).reshape(len(rsns), len(EHP_SKILLS))
+    end_xp = np.asarray(end_xp, dtype=np.int64).reshape(len(rsns), len(EHP_SKILLS))
+    gained = (hours_at(end_xp, iron) - hours_at(start_xp, iron)).sum(axis=1)
+    return np.where(known, np.round(gained, 2), -1.0)
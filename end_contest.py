@@ -32,6 +32,7 @@ from time import sleep
 from os import remove
 from math import floor
 from contests import *
+from contest_progress import ContestProgress
 from data_updater import *
 from gph_utils.gph_logging import log_message
 from gph_utils.gph_graphing import make_graph
@@ -98,12 +99,10 @@ log_message(f'Running final update for contest {title}, contest ID: {contest_id}
 update_number += 1
 contest.update_entry('update_number', update_number)
 
-# Load master dataframe from file
-master_df = pd.read_csv(MASTER_DF_NAME)
-
-# Run the contest update procedure and make copies of both dataframes
-master_df, contest_df = update_entry(group, mode, target, 'end', update_number,
-                                     master_df, logfile, datafile, contest_id)
+# Run the contest update procedure, which appends this update's rows to the master dataframe
+store = open_store()
+contest_df = update_entry(group, mode, target, 'end', update_number, store, logfile,
+                          datafile, contest_id, multi_targets)
 
 msg = ''
 
@@ -111,19 +110,18 @@ fields = []
 
 win_emoji = [':first_place:', ':second_place:', ':third_place:']
 
-for i in range(winners):
-    rsn = contest_df.at[i, 'RSN']
+for i, (rank, rsn, gained) in enumerate(contest_leaders(contest_df, winners)):
     # Handle case in which there are more winners than we have emoji
     if i < 3:
         fields.append({
             "name": f"{win_emoji[i]}: {rsn}",
-            "value": f'{contest_df.at[i, "Gained"]:,} {units} gained',
+            "value": f'{gained:,} {units} gained',
             "inline": 'false'
         })
     else:
         fields.append({
-            "name": f"{i + 1}) {rsn}",
-            "value": f'{contest_df.at[i, "Gained"]:,} {units} gained',
+            "name": f"{rank}) {rsn}",
+            "value": f'{gained:,} {units} gained',
             "inline": 'false'
         })
 
@@ -140,35 +138,16 @@ embed = [
 # TODO look into generating the text file and graph_data simultaneously
 # Create graph showing the progress of the winners to send in Discord
 
-# Collect data on the progress of the winners in a 2D list
-ranked_users = []
-graph_data = [ranked_users]
-for i in range(winners):
-    rsn = contest_df.at[i, 'RSN']
-    ranked_users.append(rsn)
-    player_data = []
-
-    for j in range(update_number + 1):
-        try:
-            row = master_df.loc[(master_df['RSN'] == rsn) & (master_df['Update number'] == j) &
-                                (master_df['Update source'] == contest_id)]
-            player_data.append(row.iloc[0][target])
-        except IndexError:
-            log_message(f'Index error encountered while graphing {rsn} at index {j}')
-            continue
-
-        except (KeyError, ValueError):
-            # Possibly encountered if a player changes names partway through a contest.
-            # TODO handle this a little more robustly
-            log_message(f'A data error was encountered for user {rsn} at update #{j}.\n'
-                        f'This may be the result of a name change.')
-            continue
-
-    start_value = player_data[0]
-    for k in range(len(player_data)):
-        player_data[k] = player_data[k] - start_value
-    graph_data.append(player_data)
-graph_data[0] = ranked_users
+# Collect data on the progress of the winners in a 2D list from the contest's progress file,
+# which has every player's score at each update.
+ranked_users = contest_df['RSN'].iloc[:winners].tolist()
+progress = ContestProgress(datafile)
+for rsn in progress.missing(ranked_users):
+    # Possibly encountered if a player changes names partway through a contest.
+    # TODO handle this a little more robustly
+    log_message(f'No data was found while graphing {rsn}.\n'
+                f'This may be the result of a name change.')
+graph_data = progress.graph_data(ranked_users, update_number)
 
 update_list = []
 for i in range(update_number + 1):
@@ -185,16 +164,8 @@ make_graph(graph_data, update_list, units, plotname, plotfile)
 if raffle_mode == 'classic':
     # Use the original raffle mode in which any player reaching
     # the participation threshold was eligible to win the raffle.
-    participants = set()
-
     # Add all participants who didn't win one of the main prizes to a set.
-    for i in range(winners, len(contest_df.index)):
-        gained = contest_df.at[i, 'Gained']
-        if gained >= threshold:
-            rsn = contest_df.at[i, 'RSN']
-            participants.add(rsn)
-        else:
-            break
+    participants = set(contest_participants(contest_df, threshold, skip=winners))
 
     line = f'\n{len(participants)} have met the participation threshold for a prize!\n'
     msg += line
@@ -224,16 +195,8 @@ elif raffle_mode == 'top_participants':
     # Use raffle mode in which only the top n_participants who reached
     # the participation threshold but didn't win one of the main prizes
     # are eligible to win a raffle prize
-    participants = set()
-
     # Make a set of everyone eligible for a prize
-    for i in range(winners, winners + n_participants):
-        gained = contest_df.at[i, 'Gained']
-        if gained >= threshold:
-            rsn = contest_df.at[i, 'RSN']
-            participants.add(rsn)
-        else:
-            break
+    participants = set(contest_participants(contest_df, threshold, skip=winners, limit=n_participants))
 
     line = f'\nHere are the top {len(participants)} who have met the participation ' \
            f'threshold of {threshold:,} {units} and are in the running for a participation ' \
@@ -265,19 +228,16 @@ with open(textfile, 'w') as file:
     file.write(f'{title} final ranks\n'
                f'------------------------------------------\n')
     file.write(f'Rank: RSN:            {units:>6} gained\n')
-    for i in range(len(contest_df.index)):
-        rsn = contest_df.at[i, 'RSN']
-        gain = contest_df.at[i, 'Gained']
+    for rank, rsn, gain in contest_leaders(contest_df, len(contest_df.index)):
         if gain <= 0:
             break
-        file.write(f'{i + 1:>3})  {rsn:<12}     {gain:>12,}\n')
+        file.write(f'{rank:>3})  {rsn:<12}     {gain:>12,}\n')
 
 log_message(f'Ranking file {textfile} created successfully.', log=logfile)
 
-# Save contest data to a separate, final file and
-# Write master_df to CSV
-contest_df.to_csv('final-' + datafile, index=False)
-master_df.to_csv(MASTER_DF_NAME, index=False)
+# Save contest data to a separate, final file, with every player's score at each update
+final_df = contest_df.join(progress.matrix.add_prefix('Update '), on='RSN')
+final_df.to_csv('final-' + datafile, index=False)
 
 log_message(f'Winners selected and raffle prize drawn for contest ID {contest_id}', log=logfile)
 
@@ -0,0 +1,29 @@
+"""export_master_dataframe.py
+Utility script to export the whole master dataframe, from whichever storage backend is in use,
+to a single CSV file in its original format.
+
+@:arg --output: str Name of the CSV file to write. Default value: 'master_dataframe_export.csv'
+
+Example call:
+
+"python export_master_dataframe.py --output 'master_dataframe_export.csv'"
+"""
+
+import argparse
+from gph_storage.store import open_store
+from gph_utils.gph_config import *
+from gph_utils.gph_logging import log_message
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--output', type=str, default='master_dataframe_export.csv', help='Name of the CSV file to write.')
+
+args = parser.parse_args()
+
+# The segmented backend reads MASTER_DF_NAME as its base until it's compacted, so exporting over it
+# would duplicate every row written since.
+if STORAGE_BACKEND == 'segmented' and args.output == MASTER_DF_NAME:
+    raise ValueError(f'Cannot export over {MASTER_DF_NAME} while it is used by the segmented backend.')
+
+open_store().export_csv(args.output)
+
+log_message(f'Master dataframe exported to {args.output}', log=LOG_NAME)
@@ -0,0 +1,174 @@
+"""gains.py
+Computes players' gains between any two points in time from the history in the master dataframe,
+using whichever snapshots exist for each player regardless of which contest or update source took
+them. Leaderboards like "the last 7 days" can then be made without fetching any extra snapshots.
+
+GainsReport ranks a group's gains in every skill, activity and boss at once, and caches the gains
+of each period it reports on so later reports and queries on the same period reuse them.
+"""
+import os
+import numpy as np
+import pandas as pd
+import hs_wrapper as hs
+
+from gph_utils.gph_config import *
+from gph_storage.aggregates import PeriodAggregates
+from gph_storage.base import TimeIndex
+from gph_storage.store import open_store
+
+"""Columns of a gains pd.DataFrame describing the snapshots used, rather than gains in an entry
+"""
+SNAPSHOT_INFO_COLUMNS = ['Start time', 'End time', 'Start update', 'End update']
+
+
+def gains_between(start: int, end: int, columns=None, rsns=None, store=None, start_values=False):
+    """Calculates what every player gained between two times, for every column at once.
+
+    Each player's gains are measured from their latest snapshot at or before start (or, if they have
+    none that early, their earliest snapshot after it) to their latest snapshot at or before end.
+
+    :param start: int epoch time to measure gains from.
+    :param end: int epoch time to measure gains to.
+    :param columns: list of str highscores entries to calculate gains for. Defaults to hs.ENTRIES.
+    :param rsns: list of str OSRS usernames to calculate gains for. Defaults to every player in the
+    master dataframe.
+    :param store: SnapshotStore to read snapshots from. Defaults to the store returned by open_store().
+    :param start_values: bool, if True the values in each player's start snapshot are returned too.
+    :return: pd.DataFrame indexed by RSN, with the 'Start time' and 'End time' of the snapshots used
+    followed by the gains in each column. Players without any snapshot from start to end are left out.
+    If start_values is True, a tuple of that and a pd.DataFrame of the start snapshots' values in the
+    same layout.
+    """
+    columns = hs.ENTRIES if columns is None else list(columns)
+    if store is None:
+        store = open_store()
+    rows = store.load(columns=['Timestamp', 'RSN'] + columns)
+    if rsns is None:
+        rsns = rows['RSN'].unique().tolist()
+    rsns = np.asarray(rsns, dtype=object)
+
+    index = TimeIndex(rows['RSN'], rows['Timestamp'])
+    start_rows = index.as_of(rsns, start)
+    start_rows = np.where(start_rows >= 0, start_rows, index.at_or_after(rsns, start))
+    end_rows = index.as_of(rsns, end)
+
+    times = rows['Timestamp'].to_numpy(dtype=np.int64)
+    # Players whose latest snapshot is from before start weren't seen in the period at all
+    found = (start_rows >= 0) & (end_rows >= 0)
+    found[found] = times[end_rows[found]] >= start
+    start_rows, end_rows = start_rows[found], end_rows[found]
+
+    values = rows[columns].to_numpy(dtype=np.int64)
+    gains = pd.DataFrame(values[end_rows] - values[start_rows], columns=columns,
+                         index=pd.Index(rsns[found], name='RSN'))
+    gains.insert(0, 'Start time', times[start_rows])
+    gains.insert(1, 'End time', times[end_rows])
+    if start_values:
+        return gains, pd.DataFrame(values[start_rows], columns=columns, index=gains.index)
+    return gains
+
+
+class GainsReport:
+    """Every player's gains in every column over some period, with the top players and group totals
+    of each column.
+    """
+    def __init__(self, gains: pd.DataFrame):
+        """
+        :param gains: pd.DataFrame indexed by RSN with 'Start time', 'End time' and a column of int
+        gains per highscores entry, as returned by gains_between() or PeriodAggregates.gains(). Any of
+        SNAPSHOT_INFO_COLUMNS aren't reported on.
+        """
+        self.gains = gains
+        self.columns = [column for column in gains.columns if column not in SNAPSHOT_INFO_COLUMNS]
+
+    @classmethod
+    def for_period(cls, period: str, aggregates=None, cache_dir=GAINS_CACHE_DIR) -> 'GainsReport':
+        """Makes the report for a period from the period aggregates, reusing the cached gains if the
+        period's aggregates haven't changed since they were calculated.
+
+        :param period: str period ID, such as 'WEEK_0123' (see gph_storage/aggregates.py).
+        :param aggregates: PeriodAggregates to read. Defaults to the aggregates in AGGREGATES_NAME.
+        :param cache_dir: str directory the gains of each period are cached in.
+        :return: GainsReport covering every entry in hs.ENTRIES.
+        """
+        if aggregates is None:
+            aggregates = PeriodAggregates()
+        version = np.array(aggregates.version(period), dtype=np.int64)
+        filename = os.path.join(cache_dir, f'{period}.npz')
+        if os.path.exists(filename):
+            with np.load(filename, allow_pickle=True) as cached:
+                if (np.array_equal(cached['version'], version) and list(cached['columns']) == hs.ENTRIES
+                        and 'start_updates' in cached.files):
+                    gains = pd.DataFrame(cached['values'], columns=hs.ENTRIES,
+                                         index=pd.Index(cached['rsns'], name='RSN'))
+                    gains.insert(0, 'Start time', cached['start_times'])
+                    gains.insert(1, 'End time', cached['end_times'])
+                    gains.insert(2, 'Start update', cached['start_updates'])
+                    gains.insert(3, 'End update', cached['end_updates'])
+                    return cls(gains)
+
+        gains = aggregates.gains(period)
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(filename + '.tmp', 'wb') as file:
+            np.savez(file, version=version, columns=np.array(hs.ENTRIES, dtype=object),
+                     rsns=gains.index.to_numpy(dtype=object), values=gains[hs.ENTRIES].to_numpy(dtype=np.int64),
+                     start_times=gains['Start time'].to_numpy(dtype=np.int64),
+                     end_times=gains['End time'].to_numpy(dtype=np.int64),
+                     start_updates=gains['Start update'].to_numpy(dtype=np.int64),
+                     end_updates=gains['End update'].to_numpy(dtype=np.int64))
+        os.replace(filename + '.tmp', filename)
+        return cls(gains)
+
+    def top(self, n=3, columns=None) -> dict:
+        """Ranks the players who gained the most in each column.
+
+        :param n: int number of players to list per column.
+        :param columns: list of str columns to rank. Defaults to every column in the report.
+        :return: dict mapping each column to a list of up to n (RSN, gain) tuples, highest gain first.
+        Only players who gained something are listed. Ties keep the order of the report's rows.
+        """
+        columns = self.columns if columns is None else list(columns)
+        values = self.gains[columns].to_numpy(dtype=np.int64)
+        rsns = self.gains.index.to_numpy(dtype=object)
+        # Find the top n of every column at once. Each key is unique, highest gain first and then
+        # earliest row, so only the top n need to be sorted.
+        keys = -values * len(rsns) + np.arange(len(rsns))[:, np.newaxis]
+        n = min(n, len(rsns))
+        order = np.argpartition(keys, n - 1, axis=0)[:n] if n > 0 else np.empty((0, len(columns)), dtype=np.int64)
+        order = np.take_along_axis(order, np.argsort(np.take_along_axis(keys, order, axis=0), axis=0), axis=0)
+        top_values = np.take_along_axis(values, order, axis=0)
+        return {column: [(rsns[row], int(gain)) for row, gain in zip(order[:, i], top_values[:, i]) if gain > 0]
+                for i, column in enumerate(columns)}
+
+    def totals(self, columns=None) -> pd.DataFrame:
+        """Totals the group's gains in each column.
+
+        :param columns: list of str columns to total. Defaults to every column in the report.
+        :return: pd.DataFrame indexed by column, with the 'Total gained' by the whole group and the
+        number of 'Players gained' something.
+        """
+        columns = self.columns if columns is None else list(columns)
+        values = self.gains[columns].to_numpy(dtype=np.int64)
+        # Decreases, such as a player dropping off the highscores, don't count against the group
+        gained = np.clip(values, 0, None)
+        return pd.DataFrame({'Total gained': gained.sum(axis=0), 'Players gained': (gained > 0).sum(axis=0)},
+                            index=pd.Index(columns, name='Entry'))
+
+    def to_text(self, title: str, n=3) -> str:
+        """Formats the top n players and group total of every column as plain text, like the contest
+        ranking files.
+
+        :param title: str heading for the report.
+        :param n: int number of players to list per column.
+        :return: str report.
+        """
+        top = self.top(n)
+        totals = self.totals()
+        lines = [title, '------------------------------------------']
+        for column in self.columns:
+            if not top[column]:
+                continue
+            lines.append(f'\n{column}: {totals.at[column, "Total gained"]:,} gained by '
+                         f'{totals.at[column, "Players gained"]:,} players')
+            lines += [f'{i + 1:>3})  {rsn:<12}     {gain:>12,}' for i, (rsn, gain) in enumerate(top[column])]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,28 @@
+"""gains_report.py
+Utility script to print the top players and group totals of every skill, activity and boss over a
+period, such as a week or month tracked by the cron scripts, from the period aggregates (see
+gph_storage/aggregates.py). The gains are cached, so repeated queries on a period are fast.
+
+@:arg period: str period ID, such as 'WEEK_0123', 'MONTH_0123' or 'SOURCE_<contest ID>'.
+@:arg --top_n: int Number of players to list per entry. Default value: 3
+@:arg --entries: str Comma separated highscores entries to report on. Defaults to every entry.
+
+Example call:
+
+"python gains_report.py 'WEEK_0123' --top_n 5 --entries 'overall,zulrah'"
+"""
+
+import argparse
+from gains import GainsReport, SNAPSHOT_INFO_COLUMNS
+
+parser = argparse.ArgumentParser()
+parser.add_argument('period', type=str, help='Period ID to report on.')
+parser.add_argument('--top_n', type=int, default=3, help='Number of players to list per entry.')
+parser.add_argument('--entries', type=str, default=None, help='Comma separated highscores entries to report on.')
+
+args = parser.parse_args()
+
+report = GainsReport.for_period(args.period)
+if args.entries is not None:
+    report = GainsReport(report.gains[SNAPSHOT_INFO_COLUMNS + args.entries.split(',')])
+print(report.to_text(f'Top gains for {args.period}', n=args.top_n))
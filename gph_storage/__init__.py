@@ -0,0 +1,7 @@
+"""gph_storage/__init__.py
+Initialization file for the gph_storage subpackage, which stores the history of players'
+highscores snapshots (the master dataframe).
+"""
+
+# Submodules to include when using 'from gph_storage import *'
+__all__ = ["aggregates", "base", "columnar", "delta", "latest", "matrix", "segmented", "sqlite_store", "store"]
@@ -0,0 +1,161 @@
+"""aggregates.py
+Per-period aggregates of the master dataframe: each player's first and latest snapshot in every
+week and month. They're kept up to date as snapshots are appended, so end of period reports like
+top_players.py only need to read one row per player rather than scanning the history.
+
+Periods are named like the source IDs used by the weekly and monthly cron scripts:
+'WEEK_<ISO week><ISO year>' and 'MONTH_<month><ISO year>', e.g. 'WEEK_0123' and 'MONTH_0123'.
+The updates made for each update source are also aggregated, as the period 'SOURCE_<source ID>'.
+"""
+import sqlite3
+import numpy as np
+import pandas as pd
+import hs_wrapper as hs
+
+from datetime import datetime
+from gph_utils.gph_config import *
+from gph_storage.base import timestamps_to_epoch
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+def period_ids(epochs: np.ndarray) -> tuple:
+    """Returns the week and month period IDs, in local time, of each of an array of int epoch times."""
+    codes, uniques = pd.factorize(epochs)
+    weeks, months = [], []
+    for epoch in uniques:
+        when = datetime.fromtimestamp(int(epoch))
+        iso_year, iso_week, _ = when.isocalendar()
+        weeks.append(f'WEEK_{iso_week:02d}{iso_year % 100:02d}')
+        months.append(f'MONTH_{when.month:02d}{iso_year % 100:02d}')
+    return np.array(weeks, dtype=object)[codes], np.array(months, dtype=object)[codes]
+
+
+def source_period(source_id: str) -> str:
+    """Returns the period ID that the updates made for an update source are aggregated under."""
+    return f'SOURCE_{source_id}'
+
+
+class PeriodAggregates:
+    """Each player's first ('start') and latest ('latest') snapshot in every period, stored in an
+    SQLite database.
+    """
+    def __init__(self, filename=AGGREGATES_NAME):
+        self.filename = filename
+        with self._connect() as conn:
+            columns = ', '.join(f'{_quote(entry)} INTEGER NOT NULL DEFAULT 0' for entry in hs.ENTRIES)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS aggregates (period TEXT NOT NULL, "RSN" TEXT NOT NULL, '
+                         f'kind TEXT NOT NULL, "Timestamp" INTEGER NOT NULL, "Update number" INTEGER NOT NULL, '
+                         f'{columns}, PRIMARY KEY (period, "RSN", kind))')
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(aggregates)')}
+            # Aggregates made before update numbers were stored get -1, so they aren't mistaken for
+            # update 0 until they're rebuilt with rebuild_aggregates.py
+            if 'Update number' not in existing:
+                conn.execute('ALTER TABLE aggregates ADD COLUMN "Update number" INTEGER NOT NULL DEFAULT -1')
+            # Entries added to hs_wrapper since the table was created are added as new columns
+            for entry in hs.ENTRIES:
+                if entry not in existing:
+                    conn.execute(f'ALTER TABLE aggregates ADD COLUMN {_quote(entry)} INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.filename, timeout=30)
+
+    def update(self, snapshots: pd.DataFrame) -> None:
+        """Updates the aggregates of every period the snapshots fall in.
+
+        :param snapshots: pd.DataFrame with columns matching gph_storage.base.SNAPSHOT_COLUMNS.
+        """
+        if snapshots.empty:
+            return
+        rows = snapshots[['RSN', 'Update number'] + hs.ENTRIES].copy()
+        rows['Timestamp'] = timestamps_to_epoch(snapshots['Timestamp'])
+        weeks, months = period_ids(rows['Timestamp'].to_numpy())
+        sources = ('SOURCE_' + snapshots['Update source'].astype(str)).to_numpy()
+        rows = pd.concat([rows.assign(period=weeks), rows.assign(period=months), rows.assign(period=sources)],
+                         ignore_index=True)
+
+        # Only each player's first and last snapshot in each period of this batch can change anything
+        rows = rows.sort_values(by='Timestamp', kind='mergesort')
+        grouped = rows.groupby(['period', 'RSN'], sort=False)
+        starts = rows.loc[grouped.head(1).index]
+        latests = rows.loc[grouped.tail(1).index]
+
+        columns = ['period', 'RSN', 'kind', 'Timestamp', 'Update number'] + hs.ENTRIES
+        assignments = ', '.join(f'{_quote(column)} = excluded.{_quote(column)}' for column in columns[3:])
+        sql = (f'INSERT INTO aggregates ({", ".join(_quote(column) for column in columns)}) '
+               f'VALUES ({", ".join("?" * len(columns))}) ON CONFLICT (period, "RSN", kind) '
+               f'DO UPDATE SET {assignments} WHERE excluded."Timestamp" {{}} aggregates."Timestamp"')
+        with self._connect() as conn:
+            for kind, kind_rows, comparison in (('start', starts, '<'), ('latest', latests, '>=')):
+                kind_rows = kind_rows.assign(kind=kind)[columns].astype(object)
+                conn.executemany(sql.format(comparison), kind_rows.itertuples(index=False, name=None))
+
+    def has(self, period: str) -> bool:
+        """Returns True if any snapshots have been aggregated for a period."""
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM aggregates WHERE period = ? LIMIT 1', (period,)).fetchone() is not None
+
+    def has_start(self, period: str, update_number=0) -> bool:
+        """Returns True if any player's start snapshot in a period is from a given update, such as
+        the first update of an update source. Aggregates that only began part way through a period
+        don't have any.
+        """
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM aggregates WHERE period = ? AND kind = \'start\' '
+                                'AND "Update number" = ? LIMIT 1', (period, update_number)).fetchone() is not None
+
+    def version(self, period: str) -> tuple:
+        """Returns a value that changes whenever a period's aggregates do. Start snapshots are only
+        ever replaced by earlier ones and latest snapshots by later ones, so the number of players and
+        the sums of their start and latest times identify the aggregates' contents.
+        """
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*), '
+                                'COALESCE(SUM(CASE WHEN kind = \'start\' THEN "Timestamp" END), 0), '
+                                'COALESCE(SUM(CASE WHEN kind = \'latest\' THEN "Timestamp" END), 0) '
+                                'FROM aggregates WHERE period = ?', (period,)).fetchone()
+
+    def snapshots(self, period: str, columns=None) -> tuple:
+        """Reads every player's first and latest snapshot in a period.
+
+        :param period: str period ID, such as 'WEEK_0123'.
+        :param columns: list of str highscores entries to read. Defaults to hs.ENTRIES.
+        :return: tuple of pd.DataFrames of the start and latest snapshots, both indexed by RSN in the
+        same order, with the 'Timestamp' and 'Update number' of each snapshot followed by the columns.
+        """
+        columns = hs.ENTRIES if columns is None else list(columns)
+        selected = ', '.join(_quote(column) for column in ['RSN', 'kind', 'Timestamp', 'Update number'] + columns)
+        with self._connect() as conn:
+            rows = pd.read_sql_query(f'SELECT {selected} FROM aggregates WHERE period = ?', conn, params=(period,))
+        start = rows.loc[rows['kind'] == 'start'].set_index('RSN').drop(columns='kind')
+        latest = rows.loc[rows['kind'] == 'latest'].set_index('RSN').drop(columns='kind').reindex(start.index)
+        return start, latest
+
+    def gains(self, period: str, columns=None) -> pd.DataFrame:
+        """Calculates what every player gained in a period, from their first to their latest snapshot.
+
+        :param period: str period ID, such as 'WEEK_0123'.
+        :param columns: list of str highscores entries to calculate gains for. Defaults to hs.ENTRIES.
+        :return: pd.DataFrame indexed by RSN, with the 'Start time', 'End time', 'Start update' and
+        'End update' of the snapshots used followed by the gains in each column.
+        """
+        columns = hs.ENTRIES if columns is None else list(columns)
+        start, latest = self.snapshots(period, columns)
+        gains = latest[columns].astype(np.int64) - start[columns].astype(np.int64)
+        gains.insert(0, 'Start time', start['Timestamp'])
+        gains.insert(1, 'End time', latest['Timestamp'])
+        gains.insert(2, 'Start update', start['Update number'])
+        gains.insert(3, 'End update', latest['Update number'])
+        return gains
+
+    def rebuild(self, store) -> None:
+        """Rebuilds every aggregate from the raw history in a snapshot store.
+
+        :param store: SnapshotStore holding the master dataframe.
+        """
+        history = store.load()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM aggregates')
+        self.update(history)
@@ -0,0 +1,340 @@
+"""base.py
+Interface shared by every storage backend for the master dataframe.
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+import hs_wrapper as hs
+
+from contextlib import contextmanager
+from datetime import datetime
+
+"""Columns identifying each snapshot in the master dataframe
+"""
+KEY_COLUMNS = ['Timestamp', 'Update number', 'Update source', 'RSN']
+
+"""All columns of the master dataframe
+"""
+SNAPSHOT_COLUMNS = KEY_COLUMNS + hs.ENTRIES
+
+"""Columns that are 0 for most players, which data_updater.load_master_dataframe(sparse=True) returns
+as sparse columns
+"""
+SPARSE_COLUMNS = hs.ACTIVITIES + hs.BOSSES
+
+"""Format of the timestamps in master dataframes written before timestamps were stored as int
+epoch times. Reading a file in the old format converts them, and exports still use it.
+"""
+TIMESTAMP_FORMAT = '[%d %b %Y - %H:%M:%S]'
+
+
+class SnapshotStore:
+    """Base class for storage backends. A backend stores rows with the columns in SNAPSHOT_COLUMNS
+    and presents everything it has stored as one logical table. Timestamps are int epoch times.
+    """
+    # PeriodAggregates kept up to date with every append, if set (see store.open_store())
+    aggregates = None
+    # LatestSnapshots kept up to date with every append, if set
+    latest = None
+
+    def append(self, snapshots: pd.DataFrame) -> None:
+        """Adds rows to the store, and updates the period aggregates and latest snapshots with them.
+
+        :param snapshots: pd.DataFrame with columns matching SNAPSHOT_COLUMNS.
+        """
+        if snapshots.empty:
+            return
+        self._append(snapshots)
+        if self.aggregates is not None:
+            self.aggregates.update(snapshots)
+        if self.latest is not None:
+            self.latest.update(snapshots)
+
+    def _append(self, snapshots: pd.DataFrame) -> None:
+        """Writes rows to the backend's storage. Implemented by each backend.
+
+        :param snapshots: pd.DataFrame with columns matching SNAPSHOT_COLUMNS.
+        """
+        raise NotImplementedError
+
+    def load(self, columns=None, sources=None) -> pd.DataFrame:
+        """Reads rows from the store.
+
+        :param columns: list of str columns to load. Defaults to all of SNAPSHOT_COLUMNS.
+        :param sources: list of str update sources (such as contest IDs) to load rows for.
+        Defaults to loading rows from every source.
+        :return: pd.DataFrame of the requested columns. Rows from any one source are in the order they
+        were appended.
+        """
+        raise NotImplementedError
+
+    def series(self, source_id: str, rsns: list, column: str) -> pd.DataFrame:
+        """Reads one column's value for several players at every update of a source, such as the
+        target of a contest for the players shown on its graph.
+
+        :param source_id: str update source to read.
+        :param rsns: list of str OSRS usernames.
+        :param column: str column to read.
+        :return: pd.DataFrame indexed by update number with one column per RSN in rsns, in the
+        order given. Updates a player has no row for are NaN.
+        """
+        rows = self.load(columns=['Update number', 'RSN', column], sources=[source_id])
+        return self._pivot(rows.loc[rows['RSN'].isin(rsns)], rsns, column)
+
+    def first_last(self, source_id: str, rsn: str, columns=None) -> tuple:
+        """Reads a player's first and last snapshots from a source.
+
+        :param source_id: str update source to read.
+        :param rsn: String of player's OSRS username.
+        :param columns: list of str columns to load. Defaults to all of SNAPSHOT_COLUMNS.
+        :return: tuple of pd.Series rows with the lowest and highest update numbers, or
+        (None, None) if the player has no rows in the source.
+        """
+        usecols = SNAPSHOT_COLUMNS if columns is None else list(dict.fromkeys(['RSN', 'Update number'] + list(columns)))
+        rows = self.load(columns=usecols, sources=[source_id])
+        rows = rows.loc[rows['RSN'] == rsn].sort_values(by='Update number', kind='mergesort')
+        if rows.empty:
+            return None, None
+        rows = rows[SNAPSHOT_COLUMNS if columns is None else list(columns)]
+        return rows.iloc[0], rows.iloc[-1]
+
+    def as_of(self, rsns: list, column: str, when) -> pd.Series:
+        """Reads each player's value of a column in their latest snapshot taken at or before a time.
+
+        :param rsns: list of str OSRS usernames.
+        :param column: str column to read.
+        :param when: int epoch time, or a list of them with one for each RSN in rsns.
+        :return: pd.Series indexed by rsns. Players with no snapshot by then are NaN.
+        """
+        rows = self.load(columns=['Timestamp', 'RSN', column])
+        positions = TimeIndex(rows['RSN'], rows['Timestamp']).as_of(rsns, when)
+        return _take(rows[column], positions, rsns)
+
+    def between(self, start: int, end: int, columns=None) -> pd.DataFrame:
+        """Reads every snapshot taken between two times.
+
+        :param start: int epoch time of the earliest snapshot to include.
+        :param end: int epoch time of the latest snapshot to include.
+        :param columns: list of str columns to load. Defaults to all of SNAPSHOT_COLUMNS.
+        :return: pd.DataFrame of the requested columns, sorted by time.
+        """
+        usecols = SNAPSHOT_COLUMNS if columns is None else list(dict.fromkeys(['Timestamp', 'RSN'] + list(columns)))
+        rows = self.load(columns=usecols)
+        positions = TimeIndex(rows['RSN'], rows['Timestamp']).between(start, end)
+        return rows.iloc[positions][SNAPSHOT_COLUMNS if columns is None else list(columns)].reset_index(drop=True)
+
+    def compact(self) -> None:
+        """Reorganizes stored data for faster reads. Does nothing for backends that don't need it."""
+        pass
+
+    def export_csv(self, filename: str) -> None:
+        """Writes the whole store to a single CSV file in the master dataframe's original format."""
+        df = self.load()
+        df['Timestamp'] = epoch_to_timestamps(df['Timestamp'].to_numpy())
+        df.to_csv(filename, index=False)
+
+    @staticmethod
+    def _read_columns(columns, sources) -> list:
+        """Returns the columns that need to be read to load columns filtered by sources."""
+        if columns is None:
+            return SNAPSHOT_COLUMNS
+        if sources is not None and 'Update source' not in columns:
+            return list(columns) + ['Update source']
+        return list(columns)
+
+    @staticmethod
+    def _select(df: pd.DataFrame, columns, sources) -> pd.DataFrame:
+        """Filters rows read from storage down to sources and columns, converting any timestamps
+        still in TIMESTAMP_FORMAT to epoch times.
+        """
+        if sources is not None:
+            df = df.loc[df['Update source'].isin(sources)]
+        if columns is not None:
+            df = df[list(columns)]
+        df = df.reset_index(drop=True)
+        if 'Timestamp' in df.columns and df['Timestamp'].dtype.kind not in 'iu':
+            df['Timestamp'] = timestamps_to_epoch(df['Timestamp'])
+        return df
+
+    @staticmethod
+    def _pivot(rows: pd.DataFrame, rsns: list, column: str) -> pd.DataFrame:
+        """Turns rows of 'Update number', 'RSN' and column into the table returned by series(),
+        keeping the first row stored for any player at each update.
+        """
+        rows = rows.drop_duplicates(subset=['Update number', 'RSN'], keep='first')
+        table = rows.pivot(index='Update number', columns='RSN', values=column)
+        return table.reindex(columns=list(rsns)).sort_index()
+
+
+class TimeIndex:
+    """Sorted index over the times of snapshots, both per player and overall, so that lookups by
+    time are binary searches rather than scans of every row.
+    """
+    def __init__(self, rsns: pd.Series, timestamps: pd.Series):
+        """
+        :param rsns: pd.Series of the RSN of each snapshot.
+        :param timestamps: pd.Series of the int epoch time of each snapshot.
+        """
+        codes, players = pd.factorize(rsns)
+        self.players = {rsn: i for i, rsn in enumerate(players)}
+        epochs = timestamps_to_epoch(timestamps)
+        # Snapshots sorted by (player, time), searched with a single composite key
+        keys = (codes.astype(np.int64) << 32) | epochs
+        self.player_order = np.argsort(keys, kind='stable')
+        self.player_keys = keys[self.player_order]
+        # Snapshots sorted by time alone
+        self.time_order = np.argsort(epochs, kind='stable')
+        self.times = epochs[self.time_order]
+
+    def _codes(self, rsns: list) -> np.ndarray:
+        return np.array([self.players.get(rsn, -1) for rsn in rsns], dtype=np.int64)
+
+    def as_of(self, rsns: list, when) -> np.ndarray:
+        """Finds each player's latest snapshot taken at or before a time.
+
+        :param rsns: list of str OSRS usernames.
+        :param when: int epoch time, or an array of them with one for each RSN in rsns.
+        :return: np.ndarray of the row position of each player's snapshot, or -1 if there isn't one.
+        """
+        codes = self._codes(rsns)
+        if len(self.player_keys) == 0:
+            return np.full(len(codes), -1)
+        positions = np.searchsorted(self.player_keys, (codes << 32) | np.asarray(when, dtype=np.int64),
+                                    side='right') - 1
+        found = (codes >= 0) & (positions >= 0)
+        found[found] = (self.player_keys[positions[found]] >> 32) == codes[found]
+        return np.where(found, self.player_order[np.maximum(positions, 0)], -1)
+
+    def at_or_after(self, rsns: list, when) -> np.ndarray:
+        """Finds each player's earliest snapshot taken at or after a time.
+
+        :param rsns: list of str OSRS usernames.
+        :param when: int epoch time, or an array of them with one for each RSN in rsns.
+        :return: np.ndarray of the row position of each player's snapshot, or -1 if there isn't one.
+        """
+        codes = self._codes(rsns)
+        if len(self.player_keys) == 0:
+            return np.full(len(codes), -1)
+        positions = np.searchsorted(self.player_keys, (codes << 32) | np.asarray(when, dtype=np.int64), side='left')
+        found = (codes >= 0) & (positions < len(self.player_keys))
+        found[found] = (self.player_keys[positions[found]] >> 32) == codes[found]
+        return np.where(found, self.player_order[np.minimum(positions, len(self.player_keys) - 1)], -1)
+
+    def between(self, start: int, end: int) -> np.ndarray:
+        """Returns the row positions of every snapshot taken from start to end inclusive, sorted by time."""
+        return self.time_order[np.searchsorted(self.times, start, side='left'):
+                               np.searchsorted(self.times, end, side='right')]
+
+
+def _take(values: pd.Series, positions: np.ndarray, rsns: list) -> pd.Series:
+    """Picks the values at row positions (-1 for none) into a pd.Series indexed by rsns."""
+    result = pd.Series(np.nan, index=list(rsns), dtype=object if values.dtype == object else float)
+    found = positions >= 0
+    result[found] = values.to_numpy()[positions[found]]
+    return result
+
+
+def timestamps_to_epoch(timestamps: pd.Series) -> np.ndarray:
+    """Converts master dataframe timestamps to int epoch times, parsing each distinct one once.
+    Timestamps that are already epoch times are left as they are.
+    """
+    codes, uniques = pd.factorize(timestamps)
+    epochs = np.array([datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp() if isinstance(timestamp, str)
+                       else timestamp for timestamp in uniques], dtype=np.int64)
+    return epochs[codes]
+
+
+def epoch_months(epochs: np.ndarray) -> np.ndarray:
+    """Returns the 'YYYY-MM' month, in local time, of each of an array of int epoch times."""
+    codes, uniques = pd.factorize(epochs)
+    months = np.array([datetime.fromtimestamp(int(epoch)).strftime('%Y-%m') for epoch in uniques], dtype=object)
+    return months[codes]
+
+
+def epoch_to_timestamps(epochs: np.ndarray) -> np.ndarray:
+    """Converts int epoch times back to master dataframe timestamps."""
+    codes, uniques = pd.factorize(epochs)
+    timestamps = np.array([datetime.fromtimestamp(int(epoch)).strftime(TIMESTAMP_FORMAT) for epoch in uniques],
+                          dtype=object)
+    return timestamps[codes]
+
+
+def live_files(directory: str, extension: str) -> tuple:
+    """Finds the files in an append-only directory that are still current.
+
+    Parts are named 'part-<time written>' so they sort in the order they were appended. Compaction
+    merges parts into a file named 'base-<newest part included>', after which only that base and
+    the parts written after it are current. Anything older is left over from a compaction that was
+    interrupted and should be ignored. A part is named before it's written, so writers and
+    compaction must hold directory_lock() for this to hold.
+
+    :param directory: str path of the directory to search.
+    :param extension: str file extension of the parts, including the leading '.', or a tuple of
+    extensions.
+    :return: tuple of the path of the current base file (or None) and a list of paths of the
+    current parts, in the order they were appended.
+    """
+    if not os.path.isdir(directory):
+        return None, []
+    names = sorted(os.listdir(directory))
+    bases = [name for name in names if name.startswith('base-') and name.endswith(extension)]
+    parts = [name for name in names if name.startswith('part-') and name.endswith(extension)]
+
+    base = None
+    if bases:
+        base = os.path.join(directory, bases[-1])
+        last_included = 'part-' + os.path.splitext(bases[-1])[0][len('base-'):]
+        parts = [name for name in parts if os.path.splitext(name)[0] > last_included]
+
+    return base, [os.path.join(directory, name) for name in parts]
+
+
+@contextmanager
+def directory_lock(directory: str, exclusive=False):
+    """Holds a lock on an append-only directory. Appends and reads share the lock, while compaction
+    holds it exclusively, so that no part is written or read while compaction merges and removes
+    parts. On Windows, which has no shared locks, every holder takes it exclusively.
+
+    :param directory: str path of the directory to lock.
+    :param exclusive: bool, if True no one else can hold the lock at the same time.
+    """
+    with open(os.path.join(directory, '.lock'), 'a+') as lock:
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            lock.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after about 10 seconds, so keep waiting
+                    continue
+            try:
+                yield
+            finally:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def part_name(extension: str) -> str:
+    """Returns a new, unique name for a part written by this process."""
+    return f'part-{time.time_ns():020d}-{os.getpid():07d}{extension}'
+
+
+def write_atomic(df: pd.DataFrame, filename: str, writer) -> None:
+    """Writes a file under a temporary name and then renames it, so a crash partway through a
+    write never leaves a partial file behind.
+
+    :param df: pd.DataFrame to write.
+    :param filename: str path to write to.
+    :param writer: function taking df and a path, such as pd.DataFrame.to_csv.
+    """
+    tmpfile = filename + '.tmp'
+    writer(df, tmpfile)
+    os.replace(tmpfile, filename)
@@ -0,0 +1,80 @@
+"""columnar.py
+Columnar storage for the master dataframe using Parquet files, partitioned by update source and
+month. A contest update only needs to open its own source's partitions, and only has to read the
+columns it uses from them.
+
+Requires pyarrow, which is only needed when STORAGE_BACKEND is set to 'parquet'. Appends, reads and
+compaction are coordinated with a lock file (see base.directory_lock()).
+"""
+import os
+import pandas as pd
+
+from urllib.parse import quote, unquote
+from gph_utils.gph_config import *
+from gph_storage.base import *
+
+
+def _write_parquet(df: pd.DataFrame, path: str) -> None:
+    df.to_parquet(path, index=False)
+
+
+class ParquetStore(SnapshotStore):
+    """Stores the master dataframe as 'source=<source>/month=<YYYY-MM>' partition directories.
+    Each partition is an append-only directory of Parquet parts (see live_files()).
+    """
+    def __init__(self, directory=PARQUET_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _partitions(self, sources=None) -> list:
+        """Returns the paths of every partition holding rows for sources."""
+        partitions = []
+        for source_dir in sorted(os.listdir(self.directory)):
+            if not source_dir.startswith('source='):
+                continue
+            if sources is not None and unquote(source_dir[len('source='):]) not in sources:
+                continue
+            source_path = os.path.join(self.directory, source_dir)
+            partitions += [os.path.join(source_path, month_dir) for month_dir in sorted(os.listdir(source_path))]
+        return partitions
+
+    def _append(self, snapshots: pd.DataFrame) -> None:
+        if snapshots.empty:
+            return
+        snapshots = snapshots[SNAPSHOT_COLUMNS].assign(Timestamp=timestamps_to_epoch(snapshots['Timestamp']))
+        months = epoch_months(snapshots['Timestamp'].to_numpy())
+        with directory_lock(self.directory):
+            name = part_name('.parquet')
+            for (source, month), rows in snapshots.groupby([snapshots['Update source'], months]):
+                partition = os.path.join(self.directory, f'source={quote(str(source), safe="")}', f'month={month}')
+                os.makedirs(partition, exist_ok=True)
+                write_atomic(rows, os.path.join(partition, name), _write_parquet)
+
+    def load(self, columns=None, sources=None) -> pd.DataFrame:
+        usecols = self._read_columns(columns, sources)
+        with directory_lock(self.directory):
+            files = []
+            for partition in self._partitions(sources):
+                base, parts = live_files(partition, '.parquet')
+                files += ([base] if base is not None else []) + parts
+
+            # Parts are named by when they were written, so sorting by name keeps rows from different
+            # partitions in the order they were appended.
+            files.sort(key=lambda path: os.path.basename(path)[len('part-'):])
+            frames = [pd.read_parquet(path, columns=usecols) for path in files]
+        if not frames:
+            return pd.DataFrame(columns=SNAPSHOT_COLUMNS if columns is None else list(columns))
+        return self._select(pd.concat(frames, ignore_index=True), columns, sources)
+
+    def compact(self) -> None:
+        with directory_lock(self.directory, exclusive=True):
+            for partition in self._partitions():
+                base, parts = live_files(partition, '.parquet')
+                if not parts:
+                    continue
+                merged = pd.concat([pd.read_parquet(path) for path in ([base] if base is not None else []) + parts],
+                                   ignore_index=True)
+                last_part = os.path.basename(parts[-1])
+                write_atomic(merged, os.path.join(partition, 'base-' + last_part[len('part-'):]), _write_parquet)
+                for path in ([base] if base is not None else []) + parts:
+                    os.remove(path)
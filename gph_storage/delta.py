@@ -0,0 +1,97 @@
+"""delta.py
+Delta encoding of master dataframe history. Between two updates almost none of a player's
+highscores values change, so rather than storing a full row each time, a full keyframe is stored
+every DELTA_KEYFRAME_INTERVAL rows of each player, and only the (column, value) pairs that changed
+are stored in between.
+"""
+import numpy as np
+import pandas as pd
+
+from gph_utils.gph_config import *
+from gph_storage.base import *
+
+
+def encode_deltas(snapshots: pd.DataFrame, keyframe_interval=DELTA_KEYFRAME_INTERVAL) -> dict:
+    """Delta encodes rows of the master dataframe.
+
+    :param snapshots: pd.DataFrame with columns matching SNAPSHOT_COLUMNS.
+    :param keyframe_interval: int number of a player's rows between each full keyframe.
+    :return: dict of np.ndarrays, as written by write_deltas().
+    """
+    entries = [column for column in snapshots.columns if column not in KEY_COLUMNS]
+    source_codes, sources = pd.factorize(snapshots['Update source'].astype(str))
+    rsn_codes, rsns = pd.factorize(snapshots['RSN'])
+    values = snapshots[entries].to_numpy(dtype=np.int64)
+
+    # Compare each row to the previous row of the same player
+    order = np.argsort(rsn_codes, kind='stable')
+    sorted_rsns = rsn_codes[order]
+    sorted_values = values[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_rsns[1:] != sorted_rsns[:-1]
+    position = np.arange(len(order)) - np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    keyframe = position % keyframe_interval == 0
+
+    changed = np.zeros(sorted_values.shape, dtype=bool)
+    changed[1:] = sorted_values[1:] != sorted_values[:-1]
+    changed[keyframe] = False
+    change_rows, change_columns = np.nonzero(changed)
+
+    return {'entries': np.array(entries, dtype=str),
+            'timestamps': timestamps_to_epoch(snapshots['Timestamp']),
+            'update_numbers': snapshots['Update number'].to_numpy(dtype=np.int64),
+            'sources': np.array(sources, dtype=str), 'source_codes': source_codes,
+            'rsns': np.array(rsns, dtype=str), 'rsn_codes': rsn_codes,
+            'keyframe_rows': order[keyframe], 'keyframe_values': sorted_values[keyframe],
+            'change_rows': order[change_rows], 'change_columns': change_columns.astype(np.uint16),
+            'change_values': sorted_values[change_rows, change_columns]}
+
+
+def decode_deltas(encoded: dict) -> pd.DataFrame:
+    """Rebuilds the rows of the master dataframe from their delta encoding.
+
+    :param encoded: dict of np.ndarrays returned by encode_deltas().
+    :return: pd.DataFrame with columns matching SNAPSHOT_COLUMNS, in the order the rows were encoded.
+    Columns that didn't exist when the rows were encoded are filled with 0.
+    """
+    entries = list(encoded['entries'])
+    rsn_codes = encoded['rsn_codes']
+    rows = len(rsn_codes)
+
+    values = np.zeros((rows, len(entries)), dtype=np.int64)
+    known = np.zeros((rows, len(entries)), dtype=bool)
+    values[encoded['keyframe_rows']] = encoded['keyframe_values']
+    known[encoded['keyframe_rows']] = True
+    values[encoded['change_rows'], encoded['change_columns']] = encoded['change_values']
+    known[encoded['change_rows'], encoded['change_columns']] = True
+
+    # Fill every value that wasn't stored from the player's previous row. Each player's first row
+    # is a keyframe, so the running maximum never reaches back into another player's rows.
+    order = np.argsort(rsn_codes, kind='stable')
+    source_row = np.where(known[order], np.arange(rows)[:, None], 0)
+    np.maximum.accumulate(source_row, axis=0, out=source_row)
+    filled = np.empty_like(values)
+    filled[order] = values[order][source_row, np.arange(len(entries))]
+
+    df = pd.DataFrame(filled, columns=entries)
+    if 'timestamp_codes' in encoded:
+        # Written before timestamps were stored as epoch times
+        df.insert(0, 'Timestamp', timestamps_to_epoch(encoded['timestamps'].astype(object)[encoded['timestamp_codes']]))
+    else:
+        df.insert(0, 'Timestamp', encoded['timestamps'])
+    df.insert(1, 'Update number', encoded['update_numbers'])
+    df.insert(2, 'Update source', encoded['sources'].astype(object)[encoded['source_codes']])
+    df.insert(3, 'RSN', encoded['rsns'].astype(object)[encoded['rsn_codes']])
+    return df.reindex(columns=SNAPSHOT_COLUMNS, fill_value=0)
+
+
+def write_deltas(snapshots: pd.DataFrame, filename: str) -> None:
+    """Writes rows of the master dataframe to a compressed .npz file in delta encoding."""
+    with open(filename, 'wb') as file:
+        np.savez_compressed(file, **encode_deltas(snapshots))
+
+
+def read_deltas(filename: str) -> pd.DataFrame:
+    """Reads rows of the master dataframe written by write_deltas()."""
+    with np.load(filename) as encoded:
+        return decode_deltas(dict(encoded))
@@ -0,0 +1,98 @@
+"""latest.py
+Each player's latest snapshot, kept up to date as snapshots are appended to the master dataframe.
+Anything that only needs a player's current highscores, like seeding the poll scheduler or the
+Clockwork Penguin bot's lookups, can read one row per player from here rather than the history.
+"""
+import sqlite3
+import numpy as np
+import pandas as pd
+import hs_wrapper as hs
+
+from gph_utils.gph_config import *
+from gph_storage.aggregates import _quote
+from gph_storage.base import KEY_COLUMNS, timestamps_to_epoch
+
+
+class LatestSnapshots:
+    """Each player's latest snapshot, keyed by normalized RSN and stored in an SQLite database."""
+    def __init__(self, filename=LATEST_STATE_NAME):
+        self.filename = filename
+        with self._connect() as conn:
+            columns = ', '.join(f'{_quote(entry)} INTEGER NOT NULL DEFAULT 0' for entry in hs.ENTRIES)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS latest (key TEXT PRIMARY KEY, "Timestamp" INTEGER NOT NULL, '
+                         f'"Update number" INTEGER NOT NULL, "Update source" TEXT NOT NULL, "RSN" TEXT NOT NULL, '
+                         f'{columns})')
+            # Entries added to hs_wrapper since the table was created are added as new columns
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(latest)')}
+            for entry in hs.ENTRIES:
+                if entry not in existing:
+                    conn.execute(f'ALTER TABLE latest ADD COLUMN {_quote(entry)} INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.filename, timeout=30)
+
+    def update(self, snapshots: pd.DataFrame) -> None:
+        """Replaces the stored snapshot of every player in snapshots with their newest one, unless the
+        stored snapshot is newer.
+
+        :param snapshots: pd.DataFrame with columns matching gph_storage.base.SNAPSHOT_COLUMNS.
+        """
+        if snapshots.empty:
+            return
+        rows = snapshots[KEY_COLUMNS + hs.ENTRIES].copy()
+        rows['Timestamp'] = timestamps_to_epoch(snapshots['Timestamp'])
+        rows.insert(0, 'key', rows['RSN'].astype(str).map(hs.normalize_rsn))
+        rows['Update source'] = rows['Update source'].astype(str)
+        rows = rows.sort_values(by='Timestamp', kind='mergesort').drop_duplicates(subset='key', keep='last')
+
+        columns = rows.columns.tolist()
+        assignments = ', '.join(f'{_quote(column)} = excluded.{_quote(column)}' for column in columns[1:])
+        sql = (f'INSERT INTO latest ({", ".join(_quote(column) for column in columns)}) '
+               f'VALUES ({", ".join("?" * len(columns))}) ON CONFLICT (key) '
+               f'DO UPDATE SET {assignments} WHERE excluded."Timestamp" >= latest."Timestamp"')
+        with self._connect() as conn:
+            conn.executemany(sql, rows.astype(object).itertuples(index=False, name=None))
+
+    def read(self, rsns=None, columns=None) -> pd.DataFrame:
+        """Reads players' latest snapshots.
+
+        :param rsns: list of str OSRS usernames to read. Defaults to every player.
+        :param columns: list of str highscores entries to read. Defaults to hs.ENTRIES.
+        :return: pd.DataFrame with the columns in gph_storage.base.KEY_COLUMNS followed by the
+        requested columns, with a row for each player that has a snapshot.
+        """
+        columns = hs.ENTRIES if columns is None else list(columns)
+        selected = ', '.join(_quote(column) for column in ['key'] + KEY_COLUMNS + columns)
+        with self._connect() as conn:
+            rows = pd.read_sql_query(f'SELECT {selected} FROM latest', conn)
+        if rsns is not None:
+            keys = pd.Index(rows['key'])
+            positions = keys.get_indexer([hs.normalize_rsn(rsn) for rsn in rsns])
+            rows = rows.iloc[positions[positions >= 0]]
+        return rows.drop(columns='key').reset_index(drop=True)
+
+    def entry(self, rsn: str):
+        """Reads a player's latest snapshot as a HiscoresEntry, which can be used in place of one
+        fetched with hs_wrapper.get_user(), for instance by hs_wrapper.fetch_all_skills().
+
+        :param rsn: String of player's OSRS username.
+        :return: HiscoresEntry for the player, or None if they have no snapshots.
+        """
+        selected = ', '.join(_quote(entry) for entry in hs.ENTRIES)
+        with self._connect() as conn:
+            row = conn.execute(f'SELECT "RSN", "Timestamp", {selected} FROM latest WHERE key = ?',
+                               (hs.normalize_rsn(rsn),)).fetchone()
+        if row is None:
+            return None
+        values = np.array(row[2:], dtype=np.int64)
+        return hs.HiscoresEntry(row[0], values, hs.levels_from_xp(values), fetched_at=row[1])
+
+    def rebuild(self, store) -> None:
+        """Rebuilds the table from the raw history in a snapshot store.
+
+        :param store: SnapshotStore holding the master dataframe.
+        """
+        history = store.load()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM latest')
+        self.update(history)
@@ -0,0 +1,345 @@
+"""matrix.py
+Storage for the master dataframe as memory-mapped integer arrays. Highscores values are kept in a
+fixed-width uint32 matrix (with overall XP, which can exceed 2^32, in a separate uint64 column),
+and each row's player, source, update number and time are kept in a small side index. Loads only
+read the rows and columns they ask for from the mapped files, so the history never needs to fit in
+memory at once.
+
+Files in the directory:
+ layout.json        Player and source names and the versions of the column layout
+ values-v<n>.u32    Row-major uint32 matrix of the values of layout version n
+ wide-v<n>.u64      Row-major uint64 matrix of the wide columns of layout version n
+ index.bin          One INDEX_DTYPE record per row, across every version
+ order-<a>-<b>.u32  Rows a to b - 1 sorted by (source, player, update number). Each append adds a run
+                    for its own rows and merges it with the runs before it while they're of similar
+                    size, so there are only O(log rows) runs. Reads merge them into one order.
+
+Adding bosses or activities to hs_wrapper starts a new layout version with its own value files.
+Rows written under older versions read the new columns as 0, as if unranked.
+
+Appends and compaction hold the store's lock file (see base.directory_lock()) exclusively, and reads
+hold it shared, so files are never replaced or removed while a read is using them.
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from gph_utils.gph_config import *
+from gph_storage.base import *
+
+"""Layout of the side index, one record per row of the matrix
+"""
+INDEX_DTYPE = np.dtype([('player', '<u4'), ('source', '<u4'), ('update', '<u4'), ('epoch', '<i8')])
+
+"""Sort key of the row order, compared field by field
+"""
+KEY_DTYPE = np.dtype([('source', '<u4'), ('player', '<u4'), ('update', '<u4')])
+
+"""Columns whose values don't fit in a uint32
+"""
+WIDE_COLUMNS = ['overall']
+
+
+class MatrixStore(SnapshotStore):
+    """Stores the master dataframe as memory-mapped integer matrices with a sorted side index."""
+    def __init__(self, directory=MATRIX_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _lock(self, exclusive=True):
+        """Locks the store, exclusively while writing to it or shared while reading from it."""
+        return directory_lock(self.directory, exclusive=exclusive)
+
+    def _read_layout(self) -> dict:
+        if not os.path.exists(self._path('layout.json')):
+            return {'players': [], 'sources': [], 'versions': []}
+        with open(self._path('layout.json'), 'r') as file:
+            return json.load(file)
+
+    def _write_layout(self, layout: dict) -> None:
+        tmpfile = self._path('layout.json.tmp')
+        with open(tmpfile, 'w') as file:
+            json.dump(layout, file)
+        os.replace(tmpfile, self._path('layout.json'))
+
+    @staticmethod
+    def _rows(layout: dict) -> int:
+        return sum(version['rows'] for version in layout['versions'])
+
+    def _map(self, name: str, dtype, rows: int, width: int):
+        """Maps the first rows of a file as a (rows, width) read-only array."""
+        if rows == 0 or width == 0:
+            return np.zeros((rows, width), dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode='r', shape=(rows, width))
+
+    def _index(self, layout: dict) -> np.ndarray:
+        rows = self._rows(layout)
+        if rows == 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return np.memmap(self._path('index.bin'), dtype=INDEX_DTYPE, mode='r', shape=(rows,))
+
+    @staticmethod
+    def _run_name(run: list) -> str:
+        return f'order-{run[0]:010d}-{run[1]:010d}.u32'
+
+    @staticmethod
+    def _sort_keys(records: np.ndarray) -> np.ndarray:
+        keys = np.empty(len(records), dtype=KEY_DTYPE)
+        for field in KEY_DTYPE.names:
+            keys[field] = records[field]
+        return keys
+
+    def _merge(self, index: np.ndarray, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        """Merges two sorted runs of row numbers, with rows in first before equal rows in second."""
+        # Each row of second goes after every row of first that sorts before or equal to it
+        positions = np.searchsorted(self._sort_keys(index[first]), self._sort_keys(index[second]), side='right')
+        positions += np.arange(len(second))
+        merged = np.empty(len(first) + len(second), dtype=np.uint32)
+        from_second = np.zeros(len(merged), dtype=bool)
+        from_second[positions] = True
+        merged[from_second] = second
+        merged[~from_second] = first
+        return merged
+
+    def _write_run(self, run: list, order: np.ndarray) -> None:
+        order.astype(np.uint32).tofile(self._path(self._run_name(run) + '.tmp'))
+        os.replace(self._path(self._run_name(run) + '.tmp'), self._path(self._run_name(run)))
+
+    def _runs(self, layout: dict, index: np.ndarray) -> list:
+        """Returns the sorted runs of the row order as [first row, last row + 1] pairs. Stores written
+        before the order was kept in runs have theirs converted into a single run.
+        """
+        if 'runs' in layout:
+            return layout['runs']
+        if len(index) == 0:
+            return []
+        order = None
+        if os.path.exists(self._path('order.u32')):
+            order = np.fromfile(self._path('order.u32'), dtype=np.uint32)
+        if order is None or len(order) != len(index):
+            order = np.lexsort((index['update'], index['player'], index['source']))
+        self._write_run([0, len(index)], order)
+        return [[0, len(index)]]
+
+    def _run_orders(self, layout: dict, index: np.ndarray) -> list:
+        """Returns the sorted runs of row numbers, in the order they were appended."""
+        runs = layout.get('runs')
+        if runs is not None:
+            return [np.fromfile(self._path(self._run_name(run)), dtype=np.uint32) for run in runs]
+        order = np.fromfile(self._path('order.u32'), dtype=np.uint32) if os.path.exists(self._path('order.u32')) else None
+        if order is None or len(order) != len(index):
+            # Left over from an append that was interrupted, so sort the index again
+            order = np.lexsort((index['update'], index['player'], index['source'])).astype(np.uint32)
+        return [order]
+
+    def _order(self, layout: dict, index: np.ndarray) -> np.ndarray:
+        """Returns row numbers sorted by (source, player, update number), ties in the order appended."""
+        orders = self._run_orders(layout, index)
+        # Merge neighbouring runs pairwise, so rows appended earlier stay ahead of equal rows
+        while len(orders) > 1:
+            orders = [self._merge(index, orders[i], orders[i + 1]) if i + 1 < len(orders) else orders[i]
+                      for i in range(0, len(orders), 2)]
+        return orders[0] if orders else np.zeros(0, dtype=np.uint32)
+
+    def _append_file(self, name: str, data: np.ndarray, expected_bytes: int) -> None:
+        """Appends to a file, first dropping anything past expected_bytes left by an interrupted append."""
+        with open(self._path(name), 'ab') as file:
+            file.truncate(expected_bytes)
+            file.write(np.ascontiguousarray(data).tobytes())
+
+    def _append(self, snapshots: pd.DataFrame) -> None:
+        if snapshots.empty:
+            return
+        with self._lock():
+            layout = self._read_layout()
+            rows = self._rows(layout)
+
+            narrow = [entry for entry in hs.ENTRIES if entry not in WIDE_COLUMNS]
+            wide = [entry for entry in hs.ENTRIES if entry in WIDE_COLUMNS]
+            if not layout['versions'] or layout['versions'][-1]['columns'] != narrow \
+                    or layout['versions'][-1]['wide'] != wide:
+                # The entries have changed, so start a new version of the layout
+                version = layout['versions'][-1]['version'] + 1 if layout['versions'] else 1
+                layout['versions'].append({'version': version, 'columns': narrow, 'wide': wide, 'rows': 0})
+            current = layout['versions'][-1]
+
+            # Unranked entries are stored as 0
+            values = snapshots[narrow].to_numpy(dtype=np.int64).clip(min=0)
+            if values.size and values.max() > np.iinfo(np.uint32).max:
+                raise ValueError('Value too large for the matrix storage backend.')
+            wide_values = snapshots[wide].to_numpy(dtype=np.int64).clip(min=0)
+
+            players = {name: i for i, name in enumerate(layout['players'])}
+            sources = {name: i for i, name in enumerate(layout['sources'])}
+            for name in snapshots['RSN'].unique():
+                if name not in players:
+                    players[name] = len(layout['players'])
+                    layout['players'].append(name)
+            for name in snapshots['Update source'].astype(str).unique():
+                if name not in sources:
+                    sources[name] = len(layout['sources'])
+                    layout['sources'].append(name)
+
+            index = np.zeros(len(snapshots.index), dtype=INDEX_DTYPE)
+            index['player'] = snapshots['RSN'].map(players).to_numpy()
+            index['source'] = snapshots['Update source'].astype(str).map(sources).to_numpy()
+            index['update'] = snapshots['Update number'].to_numpy(dtype=np.int64)
+            index['epoch'] = timestamps_to_epoch(snapshots['Timestamp'])
+
+            self._append_file(f'values-v{current["version"]}.u32', values.astype(np.uint32),
+                              current['rows'] * len(narrow) * 4)
+            self._append_file(f'wide-v{current["version"]}.u64', wide_values.astype(np.uint64),
+                              current['rows'] * len(wide) * 8)
+            self._append_file('index.bin', index, rows * INDEX_DTYPE.itemsize)
+
+            # Sort only the new rows into a run of their own, then merge it with the runs before it
+            # while they're no more than twice its size. Each row is merged O(log rows) times in total.
+            full_index = np.memmap(self._path('index.bin'), dtype=INDEX_DTYPE, mode='r', shape=(rows + len(index),))
+            runs = [list(run) for run in self._runs(layout, full_index[:rows])]
+            run = [rows, rows + len(index)]
+            order = rows + np.lexsort((index['update'], index['player'], index['source']))
+            while runs and runs[-1][1] - runs[-1][0] <= 2 * (run[1] - run[0]):
+                previous = runs.pop()
+                order = self._merge(full_index, np.fromfile(self._path(self._run_name(previous)), dtype=np.uint32),
+                                    order.astype(np.uint32))
+                run = [previous[0], run[1]]
+            self._write_run(run, order)
+            runs.append(run)
+            layout['runs'] = runs
+
+            # The layout is written last, so the rows above only count once everything is in place
+            current['rows'] += len(snapshots.index)
+            self._write_layout(layout)
+
+            # Runs that were merged, or left over from an interrupted append, are no longer read
+            current_runs = {self._run_name(run) for run in runs}
+            for name in os.listdir(self.directory):
+                if name == 'order.u32' or (name.startswith('order-') and name not in current_runs):
+                    os.remove(self._path(name))
+
+    def _frame(self, layout: dict, index: np.ndarray, rownums: np.ndarray, columns: list) -> pd.DataFrame:
+        """Reads the given row numbers and columns from the mapped files."""
+        players = np.array(layout['players'], dtype=object)
+        sources = np.array(layout['sources'], dtype=object)
+        records = index[rownums]
+        data = {}
+        for column in columns:
+            if column == 'Timestamp':
+                data[column] = records['epoch'].astype(np.int64)
+            elif column == 'Update number':
+                data[column] = records['update'].astype(np.int64)
+            elif column == 'Update source':
+                data[column] = sources[records['source']]
+            elif column == 'RSN':
+                data[column] = players[records['player']]
+            else:
+                data[column] = np.zeros(len(rownums), dtype=np.int64)
+
+        entries = [column for column in columns if column not in KEY_COLUMNS]
+        start = 0
+        for version in layout['versions']:
+            end = start + version['rows']
+            selected = (rownums >= start) & (rownums < end)
+            if selected.any():
+                local = rownums[selected] - start
+                values = self._map(f'values-v{version["version"]}.u32', np.uint32, version['rows'],
+                                   len(version['columns']))
+                wide = self._map(f'wide-v{version["version"]}.u64', np.uint64, version['rows'], len(version['wide']))
+                for column in entries:
+                    if column in version['columns']:
+                        data[column][selected] = values[local, version['columns'].index(column)]
+                    elif column in version['wide']:
+                        data[column][selected] = wide[local, version['wide'].index(column)]
+            start = end
+        return pd.DataFrame(data, columns=columns)
+
+    def load(self, columns=None, sources=None) -> pd.DataFrame:
+        columns = SNAPSHOT_COLUMNS if columns is None else list(columns)
+        with self._lock(exclusive=False):
+            layout = self._read_layout()
+            index = self._index(layout)
+            if sources is None:
+                rownums = np.arange(len(index))
+            else:
+                source_ids = [i for i, name in enumerate(layout['sources']) if name in sources]
+                rownums = np.flatnonzero(np.isin(index['source'], source_ids))
+            return self._frame(layout, index, rownums, columns)
+
+    def _sorted_keys(self, layout: dict, index: np.ndarray) -> list:
+        """Returns each sorted run of rows with the matching (source, player) keys to search it with."""
+        return [(order, (index['source'][order].astype(np.uint64) << np.uint64(32)) | index['player'][order])
+                for order in self._run_orders(layout, index)]
+
+    @staticmethod
+    def _player_rows(layout: dict, index: np.ndarray, runs: list, source_id: str, rsn: str) -> np.ndarray:
+        """Returns a player's row numbers in a source, sorted by update number."""
+        if source_id not in layout['sources'] or rsn not in layout['players']:
+            return np.zeros(0, dtype=np.int64)
+        key = np.uint64(layout['sources'].index(source_id)) << np.uint64(32) | np.uint64(layout['players'].index(rsn))
+        rownums = np.concatenate([order[np.searchsorted(keys, key, side='left'):np.searchsorted(keys, key, side='right')]
+                                  for order, keys in runs]).astype(np.int64)
+        # Runs are in the order they were appended, so a stable sort keeps ties in that order too
+        return rownums[np.argsort(index['update'][rownums], kind='stable')]
+
+    def series(self, source_id: str, rsns: list, column: str) -> pd.DataFrame:
+        with self._lock(exclusive=False):
+            layout = self._read_layout()
+            index = self._index(layout)
+            runs = self._sorted_keys(layout, index)
+            rownums = np.concatenate([self._player_rows(layout, index, runs, source_id, rsn) for rsn in rsns] +
+                                     [np.zeros(0, dtype=np.int64)])
+            rows = self._frame(layout, index, rownums, ['Update number', 'RSN', column])
+        return self._pivot(rows, rsns, column)
+
+    def first_last(self, source_id: str, rsn: str, columns=None) -> tuple:
+        with self._lock(exclusive=False):
+            layout = self._read_layout()
+            index = self._index(layout)
+            rownums = self._player_rows(layout, index, self._sorted_keys(layout, index), source_id, rsn)
+            if len(rownums) == 0:
+                return None, None
+            rows = self._frame(layout, index, rownums[[0, -1]],
+                               SNAPSHOT_COLUMNS if columns is None else list(columns))
+        return rows.iloc[0], rows.iloc[1]
+
+    def compact(self) -> None:
+        """Merges the row order into a single run, and rewrites rows stored under older layout
+        versions into the current one.
+        """
+        layout = self._read_layout()
+        if len(layout.get('runs', [])) > 1:
+            with self._lock():
+                layout = self._read_layout()
+                index = self._index(layout)
+                order = self._order(layout, index)
+                runs = layout['runs']
+                layout['runs'] = [[0, len(index)]]
+                self._write_run(layout['runs'][0], order)
+                self._write_layout(layout)
+                for run in runs:
+                    if run != layout['runs'][0]:
+                        os.remove(self._path(self._run_name(run)))
+        if len(layout['versions']) < 2:
+            return
+        with self._lock():
+            layout = self._read_layout()
+            index = self._index(layout)
+            current = dict(layout['versions'][-1])
+            merged = self._frame(layout, index, np.arange(len(index)), current['columns'] + current['wide'])
+
+            version = current['version'] + 1
+            merged[current['columns']].to_numpy(dtype=np.uint32).tofile(self._path(f'values-v{version}.u32'))
+            merged[current['wide']].to_numpy(dtype=np.uint64).tofile(self._path(f'wide-v{version}.u64'))
+            old_versions = layout['versions']
+            layout['versions'] = [{'version': version, 'columns': current['columns'], 'wide': current['wide'],
+                                   'rows': len(index)}]
+            self._write_layout(layout)
+
+            for old in old_versions:
+                for name in (f'values-v{old["version"]}.u32', f'wide-v{old["version"]}.u64'):
+                    if os.path.exists(self._path(name)):
+                        os.remove(self._path(name))
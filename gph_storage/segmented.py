@@ -0,0 +1,87 @@
+"""segmented.py
+Append-only storage for the master dataframe. Every write adds one new immutable CSV segment
+rather than rewriting the whole history, and compaction merges segments into a single base file,
+either as a CSV or delta encoded (see delta.py).
+
+Appends, reads and compaction are coordinated with a lock file (see base.directory_lock()).
+"""
+import os
+import pandas as pd
+
+from gph_utils.gph_config import *
+from gph_storage.base import *
+from gph_storage.delta import read_deltas, write_deltas
+
+
+class SegmentedStore(SnapshotStore):
+    """Stores the master dataframe as a directory of CSV segments.
+
+    Segments are written atomically and read back in the order they were appended (see
+    live_files()). A legacy master dataframe CSV is used as the base until the first compaction.
+    """
+    def __init__(self, directory=SEGMENT_DIR, legacy_file=MASTER_DF_NAME, encoding=SEGMENT_ENCODING):
+        if encoding not in ('full', 'delta'):
+            raise ValueError(f'Segment encoding {encoding} not recognized.')
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self.encoding = encoding
+        os.makedirs(directory, exist_ok=True)
+
+    def _files(self) -> tuple:
+        """Returns the current base file (or None) and the segments written after it."""
+        base, segments = live_files(self.directory, ('.csv', '.npz'))
+        if base is None and os.path.exists(self.legacy_file):
+            base = self.legacy_file
+        return base, segments
+
+    @staticmethod
+    def _read(filename: str, usecols: list) -> pd.DataFrame:
+        if filename.endswith('.npz'):
+            return read_deltas(filename)[usecols]
+        return pd.read_csv(filename, usecols=usecols)
+
+    def _append(self, snapshots: pd.DataFrame) -> None:
+        if snapshots.empty:
+            return
+        snapshots = snapshots[SNAPSHOT_COLUMNS].assign(Timestamp=timestamps_to_epoch(snapshots['Timestamp']))
+        with directory_lock(self.directory):
+            write_atomic(snapshots, os.path.join(self.directory, part_name('.csv')),
+                         lambda df, path: df.to_csv(path, index=False))
+
+    def load(self, columns=None, sources=None) -> pd.DataFrame:
+        with directory_lock(self.directory):
+            return self._load(columns, sources)
+
+    def _load(self, columns=None, sources=None) -> pd.DataFrame:
+        base, segments = self._files()
+        files = ([base] if base is not None else []) + segments
+        usecols = self._read_columns(columns, sources)
+
+        frames = [self._select(self._read(filename, usecols), columns, sources) for filename in files]
+        if not frames:
+            return pd.DataFrame(columns=SNAPSHOT_COLUMNS if columns is None else list(columns))
+        return pd.concat(frames, ignore_index=True)
+
+    def compact(self) -> None:
+        with directory_lock(self.directory, exclusive=True):
+            self._compact()
+
+    def _compact(self) -> None:
+        base, segments = self._files()
+        if not segments:
+            return
+
+        merged = self._load()
+        last_segment = os.path.basename(segments[-1])[len('part-'):-len('.csv')]
+        if self.encoding == 'delta':
+            write_atomic(merged, os.path.join(self.directory, f'base-{last_segment}.npz'), write_deltas)
+        else:
+            write_atomic(merged, os.path.join(self.directory, f'base-{last_segment}.csv'),
+                         lambda df, path: df.to_csv(path, index=False))
+
+        # Everything merged into the new base can now be removed. The legacy file is left as it
+        # is, since it's no longer read once a base exists.
+        if base is not None and base != self.legacy_file:
+            os.remove(base)
+        for filename in segments:
+            os.remove(filename)
@@ -0,0 +1,113 @@
+"""sqlite_store.py
+SQLite storage for the master dataframe. Indexes on (update source, RSN, update number),
+(RSN, timestamp) and timestamp let contest graphs, per-player lookups and time range queries read
+just the rows they need instead of filtering the whole history.
+"""
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from gph_utils.gph_config import *
+from gph_storage.base import *
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+class SQLiteStore(SnapshotStore):
+    """Stores the master dataframe in a single table of an SQLite database using WAL mode, so
+    contests reading the database don't block one that's writing to it.
+    """
+    def __init__(self, filename=SQLITE_DB_NAME):
+        self.filename = filename
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('BEGIN')
+            declared = {row[1]: row[2] for row in conn.execute('PRAGMA table_info(snapshots)')}
+            if declared.get('Timestamp') == 'TEXT':
+                self._migrate_timestamps(conn)
+            self._create_table(conn)
+
+    @staticmethod
+    def _create_table(conn: sqlite3.Connection) -> None:
+        columns = ', '.join(f'{_quote(column)} {"TEXT" if column in ("Update source", "RSN") else "INTEGER"}'
+                            for column in SNAPSHOT_COLUMNS)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS snapshots ({columns})')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_source_rsn_update ON snapshots '
+                     '("Update source", "RSN", "Update number")')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_rsn_timestamp ON snapshots ("RSN", "Timestamp")')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON snapshots ("Timestamp")')
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, snapshots: pd.DataFrame) -> None:
+        snapshots = snapshots[SNAPSHOT_COLUMNS].assign(Timestamp=timestamps_to_epoch(snapshots['Timestamp']))
+        placeholders = ', '.join('?' * len(SNAPSHOT_COLUMNS))
+        conn.executemany(f'INSERT INTO snapshots VALUES ({placeholders})',
+                         snapshots.astype(object).itertuples(index=False, name=None))
+
+    def _migrate_timestamps(self, conn: sqlite3.Connection) -> None:
+        """Rebuilds a table created when timestamps were stored as text, converting them to epoch times."""
+        legacy = pd.read_sql_query('SELECT * FROM snapshots ORDER BY rowid', conn)
+        conn.execute('DROP TABLE snapshots')
+        self._create_table(conn)
+        if not legacy.empty:
+            self._insert(conn, legacy)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.filename, timeout=30)
+
+    def _query(self, sql: str, params=()) -> pd.DataFrame:
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def _append(self, snapshots: pd.DataFrame) -> None:
+        if snapshots.empty:
+            return
+        # Every row of a run is inserted in a single transaction
+        with self._connect() as conn:
+            self._insert(conn, snapshots)
+
+    def load(self, columns=None, sources=None) -> pd.DataFrame:
+        selected = ', '.join(_quote(column) for column in (SNAPSHOT_COLUMNS if columns is None else columns))
+        if sources is None:
+            return self._query(f'SELECT {selected} FROM snapshots ORDER BY rowid')
+        placeholders = ', '.join('?' * len(sources))
+        return self._query(f'SELECT {selected} FROM snapshots WHERE "Update source" IN ({placeholders}) '
+                           f'ORDER BY rowid', tuple(sources))
+
+    def series(self, source_id: str, rsns: list, column: str) -> pd.DataFrame:
+        if not rsns:
+            return pd.DataFrame(columns=rsns)
+        placeholders = ', '.join('?' * len(rsns))
+        rows = self._query(f'SELECT "Update number", "RSN", {_quote(column)} FROM snapshots '
+                           f'WHERE "Update source" = ? AND "RSN" IN ({placeholders}) ORDER BY rowid',
+                           (source_id, *rsns))
+        return self._pivot(rows, rsns, column)
+
+    def first_last(self, source_id: str, rsn: str, columns=None) -> tuple:
+        selected = ', '.join(_quote(column) for column in (SNAPSHOT_COLUMNS if columns is None else columns))
+        sql = (f'SELECT {selected} FROM snapshots WHERE "Update source" = ? AND "RSN" = ? '
+               f'ORDER BY "Update number" {{}}, rowid LIMIT 1')
+        first = self._query(sql.format('ASC'), (source_id, rsn))
+        last = self._query(sql.format('DESC'), (source_id, rsn))
+        if first.empty:
+            return None, None
+        return first.iloc[0], last.iloc[0]
+
+    def as_of(self, rsns: list, column: str, when) -> pd.Series:
+        times = np.broadcast_to(np.asarray(when, dtype=np.int64), (len(rsns),))
+        sql = (f'SELECT {_quote(column)} FROM snapshots WHERE "RSN" = ? AND "Timestamp" <= ? '
+               f'ORDER BY "Timestamp" DESC, rowid DESC LIMIT 1')
+        values = {}
+        with self._connect() as conn:
+            for rsn, time in zip(rsns, times):
+                row = conn.execute(sql, (rsn, int(time))).fetchone()
+                if row is not None:
+                    values[rsn] = row[0]
+        return pd.Series([values.get(rsn, np.nan) for rsn in rsns], index=list(rsns))
+
+    def between(self, start: int, end: int, columns=None) -> pd.DataFrame:
+        selected = ', '.join(_quote(column) for column in (SNAPSHOT_COLUMNS if columns is None else columns))
+        return self._query(f'SELECT {selected} FROM snapshots WHERE "Timestamp" BETWEEN ? AND ? '
+                           f'ORDER BY "Timestamp", rowid', (int(start), int(end)))
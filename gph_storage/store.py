@@ -0,0 +1,36 @@
+"""store.py
+Opens the storage backend used for the master dataframe.
+"""
+from gph_utils.gph_config import *
+from gph_storage.aggregates import PeriodAggregates
+from gph_storage.base import SnapshotStore
+from gph_storage.columnar import ParquetStore
+from gph_storage.latest import LatestSnapshots
+from gph_storage.matrix import MatrixStore
+from gph_storage.segmented import SegmentedStore
+from gph_storage.sqlite_store import SQLiteStore
+
+"""Storage backends that can be selected with STORAGE_BACKEND in gph_config.py
+"""
+BACKENDS = {'segmented': SegmentedStore,
+            'parquet': ParquetStore,
+            'sqlite': SQLiteStore,
+            'matrix': MatrixStore}
+
+
+def open_store(backend=STORAGE_BACKEND, aggregates=True) -> SnapshotStore:
+    """Returns the store holding the master dataframe.
+
+    :param backend: str key of BACKENDS denoting which backend to use. Defaults to STORAGE_BACKEND
+    set in gph_config.py
+    :param aggregates: bool, if True the period aggregates and each player's latest snapshot are
+    updated whenever snapshots are appended to the store.
+    :return: SnapshotStore that scripts read snapshots from and append new snapshots to.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Storage backend {backend} not recognized.')
+    store = BACKENDS[backend]()
+    if aggregates:
+        store.aggregates = PeriodAggregates()
+        store.latest = LatestSnapshots()
+    return store
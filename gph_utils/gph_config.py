@@ -29,8 +29,75 @@ WINNERS = 3
 N_PARTICIPANTS = 10
 # File name to use for log file
 LOG_NAME = 'gph-log.txt'
-# File name for the master dataframe
+# File name for the master dataframe. Now only written by exports, but still read as the base of
+# the snapshot store until it's first compacted.
 MASTER_DF_NAME = 'master_dataframe.csv'
-# File containing a dictionary of rsns and account type
+# Backend used to store the master dataframe. Options: 'segmented' (CSV segments, the default),
+# 'parquet' (columnar files partitioned by update source and month, requires pyarrow), 'sqlite'
+# (an indexed SQLite database) or 'matrix' (memory-mapped integer arrays). Use
+# migrate_master_dataframe.py to move existing data when changing this.
+STORAGE_BACKEND = 'segmented'
+# Directory holding the segments the master dataframe is stored in by the 'segmented' backend
+SEGMENT_DIR = 'master_dataframe_segments'
+# Encoding the 'segmented' backend compacts its segments into. Options: 'full' (a CSV of every row)
+# or 'delta' (keyframes plus only the values that changed, see gph_storage/delta.py)
+SEGMENT_ENCODING = 'full'
+# Number of a player's rows between each full keyframe when delta encoding
+DELTA_KEYFRAME_INTERVAL = 28
+# Directory holding the partitions the master dataframe is stored in by the 'parquet' backend
+PARQUET_DIR = 'master_dataframe_parquet'
+# Database file the master dataframe is stored in by the 'sqlite' backend
+SQLITE_DB_NAME = 'master_dataframe.db'
+# Directory holding the arrays the master dataframe is stored in by the 'matrix' backend
+MATRIX_DIR = 'master_dataframe_matrix'
+# Database holding each player's first and latest snapshot in every week and month
+AGGREGATES_NAME = 'period_aggregates.db'
+# Directory caching the full gains matrix of each period reported on (see gains.GainsReport)
+GAINS_CACHE_DIR = 'gains_cache'
+# Database holding each player's latest snapshot, so lookups don't need to read the master dataframe
+LATEST_STATE_NAME = 'latest_snapshots.db'
+# File containing a dictionary of rsns and account type. No longer written, but read once to seed the
+# account type store below
 IRON_DICT_NAME = 'ironmen_dictionary.txt'
+# File caching each player's account type (main, ironman, hardcore_ironman, ultimate)
+ACCOUNT_TYPES_NAME = 'account_types.json'
+# Days before a cached account type is looked up again
+ACCOUNT_TYPE_TTL_DAYS = 14
+# Maximum number of highscores requests to have in flight at once when fetching a group.
+# Setting this to 1 fetches players one at a time.
+FETCH_WORKERS = 8
+# Base URL of the OSRS highscores. Can be pointed at a local server standing in for the
+# real highscores when testing.
+HISCORES_BASE_URL = 'https://secure.runescape.com'
+# Seconds to wait for a single highscores request before giving up on it
+HISCORES_TIMEOUT = 30
+# Highscores requests per second to start at, which is also the most the rate limiter will allow
+HISCORES_RATE = 10
+# Lowest rate (requests per second) the rate limiter will back off to
+HISCORES_MIN_RATE = 0.5
+# Requests per second the rate limiter adds after each fast, successful request
+HISCORES_RATE_STEP = 0.5
+# Requests slower than this many seconds make the rate limiter back off
+HISCORES_LATENCY_TARGET = 5
+# Number of times to retry a failed highscores request before deferring it to the end of the run
+HISCORES_RETRIES = 3
+# Seconds to wait before the first retry of a failed request. Doubles with each retry.
+HISCORES_BACKOFF = 1
+# Seconds a whole group's highscores requests may take before any players still not fetched are given up on
+HISCORES_DEADLINE = 600
+# Share of a group's requests that can fail before the highscores are treated as down and the rest of
+# the group is given up on, once at least HISCORES_BREAKER_MIN_REQUESTS requests have been made
+HISCORES_BREAKER_RATIO = 0.5
+HISCORES_BREAKER_MIN_REQUESTS = 10
+# File where recently fetched highscores snapshots are cached so that overlapping contests and
+# master dataframe updates only fetch each player once
+SNAPSHOT_CACHE_NAME = 'snapshot_cache.db'
+# Length of the window (in minutes) a cached snapshot is reused for. Setting this to 0 disables the cache.
+SNAPSHOT_CACHE_MINUTES = 60
+# File storing when each player was last verified against the highscores and last seen changing
+POLL_STATE_NAME = 'poll_state.csv'
+# Hours without any change to a player's highscores before they're considered idle
+IDLE_AFTER_HOURS = 72
+# Hours between polls of idle players during contest updates. Contest starts and ends poll everyone.
+IDLE_POLL_HOURS = 24
 AVATAR_URL = 'https://github.com/cdfisher/gold-partyhat/blob/master/resources/icon.png?raw=true'
@@ -0,0 +1,71 @@
+"""gph_ratelimit.py
+Implements a self-tuning token bucket used to throttle requests to the OSRS highscores.
+"""
+import time
+import asyncio
+from gph_utils.gph_config import *
+
+
+class AdaptiveRateLimiter:
+    """Token bucket limiting both the rate of requests and the number in flight at once.
+    Both limits are tuned with AIMD: they grow additively while requests succeed quickly and are
+    halved whenever a request fails or responds slower than the target latency.
+
+    The limiter only uses asyncio.sleep() to wait, so one instance can be shared by every
+    event loop a process runs and keeps what it has learned between batches.
+    """
+    def __init__(self, rate=HISCORES_RATE, max_in_flight=FETCH_WORKERS, min_rate=HISCORES_MIN_RATE,
+                 latency_target=HISCORES_LATENCY_TARGET):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.max_in_flight = max(1, max_in_flight)
+        self.latency_target = latency_target
+        self.rate = rate
+        # Allowed number of requests in flight. Kept as a float so it can grow by fractions.
+        self.window = float(self.max_in_flight)
+        self.in_flight = 0
+        self.tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        # Allow a burst of at most one second's worth of requests
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def acquire(self, give_up=None) -> bool:
+        """Waits until a request is allowed to start.
+
+        :param give_up: function returning True once the request is no longer wanted, checked while
+        waiting. Defaults to waiting for as long as it takes.
+        :return: bool, False if the wait was given up on, in which case the request must not be made.
+        """
+        while True:
+            if give_up is not None and give_up():
+                return False
+            self._refill()
+            if self.tokens >= 1.0 and self.in_flight < int(self.window):
+                self.tokens -= 1.0
+                self.in_flight += 1
+                return True
+            await asyncio.sleep(max(0.01, (1.0 - self.tokens) / self.rate))
+
+    def release(self, ok: bool, latency: float) -> None:
+        """Marks a request as finished and adjusts the limits.
+
+        :param ok: bool, False if the request failed in a way the highscores might recover from,
+        such as a timeout or server error.
+        :param latency: float seconds the request took.
+        """
+        self.in_flight -= 1
+        now = time.monotonic()
+        if ok and latency <= self.latency_target:
+            self.rate = min(self.max_rate, self.rate + HISCORES_RATE_STEP)
+            self.window = min(self.max_in_flight, self.window + 1.0 / self.window)
+        elif now - self._last_decrease > latency:
+            # Requests that were already in flight when the first one failed shouldn't each
+            # halve the limits again, so only back off once per request's worth of time.
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.window = max(1.0, self.window / 2)
+            self._last_decrease = now
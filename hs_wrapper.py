@@ -1,11 +1,19 @@
-"""Wrapper for matthew-palmer's package "osrs_highscores" which extends functionality a bit
-and helps to increase ease of use.
-Original package here: https://github.com/matthew-palmer/osrs_highscores/
-Currently uses a forked version to resolve issues which can be found here:
-https://github.com/cdfisher/osrs_highscores/
+"""Wrapper for the OSRS highscores lite API which fetches and parses players' highscores
+entries and extends functionality a bit to help increase ease of use.
+Originally built on matthew-palmer's package "osrs_highscores", which can be found here:
+https://github.com/matthew-palmer/osrs_highscores/
 """
 
-from osrs_highscores import Highscores
+import os
+import json
+import time
+import asyncio
+import aiohttp
+import random
+import numpy as np
+from ast import literal_eval
+from gph_utils.gph_config import *
+from gph_utils.gph_ratelimit import AdaptiveRateLimiter
 
 """List of all valid skills listed on highscores
 """
@@ -63,6 +71,22 @@ FORMATTED_BOSSES = ['Abyssal Sire', 'Alchemical Hydra', 'Artio', 'Barrows Chests
                     'Tombs of Amascut Expert Mode', 'TzKal-Zuk', 'TzTok-Jad', 'Venenatis', 'Vet\'ion', 'Vorkath',
                     'Wintertodt', 'Zalcano', 'Zulrah']
 
+"""All entries listed on the highscores, in the order they appear in a lite response. Matches the
+order of the hiscores columns in data_updater.master_colnames
+"""
+ENTRIES = SKILLS + ACTIVITIES + BOSSES
+
+"""Offset of each entry in ENTRIES, used to look entries up in a HiscoresEntry
+"""
+ENTRY_INDEX = {entry: i for i, entry in enumerate(ENTRIES)}
+
+"""Highscores boards that can be queried with get_users(), mapped to their path on the OSRS highscores
+"""
+HISCORES_BOARDS = {'main': 'hiscore_oldschool',
+                   'ironman': 'hiscore_oldschool_ironman',
+                   'hardcore_ironman': 'hiscore_oldschool_hardcore_ironman',
+                   'ultimate': 'hiscore_oldschool_ultimate'}
+
 """EHB_RATES:
     Dict of bosses and their respective kills per efficient bossing hour.
     EHB_RATES(boss) returns a tuple of length 2 as a key.
@@ -125,6 +149,13 @@ EHB_RATES = {'abyssal_sire': (42.0, 32.0),
              'zalcano': (-1.0, -1.0),
              'zulrah': (35.0, 32.0)}
 
+"""EHB rates of main and ironman accounts compiled into arrays, index matched with BOSSES.
+Bosses that don't count toward EHB for an account type keep their rate of -1.0, and are masked out
+by calc_ehb_batch().
+"""
+EHB_MAIN_RATES = np.array([EHB_RATES[boss][0] for boss in BOSSES], dtype=np.float64)
+EHB_IRON_RATES = np.array([EHB_RATES[boss][1] for boss in BOSSES], dtype=np.float64)
+
 
 def get_ehb(boss: str, kc: int, mode: str) -> float:
     """ Returns EHB value for a given boss.
@@ -141,19 +172,23 @@ def get_ehb(boss: str, kc: int, mode: str) -> float:
         print(f'{mode} not recognized\n')
 
 
-def calc_ehb_from_list(rsn: str, boss_kc_list: list, is_ironman=None) -> float:
+def calc_ehb_from_list(rsn: str, boss_kc_list: list, is_ironman=None, account_types=None) -> float:
     """Calculates a player's efficient hours bossed and returns it
     as a float.
     @:param rsn: str of the user's RuneScape username
     @:param boss_kc_list: list representing the player's KC for each boss
+    @:param is_ironman: bool, optional. If not given, the player's account type is read from account_types.
+    @:param account_types: AccountTypeStore to read the player's account type from. Defaults to the
+    store saved at ACCOUNT_TYPES_NAME. Does not make any highscores requests.
 
     @:return float correspoding to the player's efficient hours bossed.
     """
     if is_ironman is None:
-        try:
-            iron = is_iron(rsn)
-        except ValueError:
-            print(f'User {rsn} not found!')
+        if account_types is None:
+            account_types = AccountTypeStore()
+        iron = account_types.is_iron(rsn)
+        if iron is None:
+            print(f'Account type for user {rsn} not known!')
             return -1.0
     else:
         iron = is_ironman
@@ -174,33 +209,406 @@ def calc_ehb_from_list(rsn: str, boss_kc_list: list, is_ironman=None) -> float:
     return total_ehb
 
 
+def calc_ehb_batch(rsns: list, boss_kc: np.ndarray, account_types=None) -> np.ndarray:
+    """Calculates the efficient hours bossed of many players at once. Gives exactly the same
+    values as calling calc_ehb_from_list() for each player.
+
+    :param rsns: list of str OSRS usernames.
+    :param boss_kc: 2D array-like of each player's KC for each boss, with a row per player in rsns
+    and a column per boss in BOSSES. Sparse DataFrames of KC are fine.
+    :param account_types: AccountTypeStore to read players' account types from. Defaults to the
+    store saved at ACCOUNT_TYPES_NAME. Does not make any highscores requests.
+    :return: np.ndarray of each player's EHB, or -1.0 for players whose account type isn't known.
+    """
+    if account_types is None:
+        account_types = AccountTypeStore()
+    iron = [account_types.is_iron(rsn) for rsn in rsns]
+    for rsn, player_iron in zip(rsns, iron):
+        if player_iron is None:
+            print(f'Account type for user {rsn} not known!')
+
+    kc = np.asarray(boss_kc, dtype=np.float64).reshape(len(rsns), len(BOSSES))
+    rates = np.where(np.array([bool(player_iron) for player_iron in iron])[:, np.newaxis],
+                     EHB_IRON_RATES, EHB_MAIN_RATES)
+    # Kills only count if the player gained some and the boss counts toward EHB for their account type
+    hours = np.divide(kc, rates, out=np.zeros_like(kc), where=(kc > 0) & (rates > 0))
+    # Summing from the first boss to the last, as calc_ehb_from_list() does, rounds the same way
+    totals = np.cumsum(hours, axis=1)[:, -1] if len(BOSSES) else np.zeros(len(rsns))
+    return np.array([-1.0 if player_iron is None else round(float(total), 2)
+                     for player_iron, total in zip(iron, totals)], dtype=np.float64)
+
+
 def is_iron(rsn: str) -> bool:
     """Checks if a given player is an Ironman account.
     :param rsn: str value of a player's OSRS username
-    :return: boolean, True if user is an ironman, False if not
+    :return: boolean, True if user is any type of ironman, False if not
     @:raises ValueError if player is not found on highscores
+    @:raises HiscoresUnavailable if the highscores could not be reached
+    """
+    account_type = get_account_types([rsn])[rsn]
+    if account_type is None:
+        raise ValueError(f'User {rsn} not found on highscores.')
+    if account_type is FETCH_FAILED:
+        raise HiscoresUnavailable(f'Unable to look up account type for user {rsn}.')
+    return account_type != 'main'
+
+
+class HiscoresEntry:
+    """A player's highscores entries, parsed into a flat integer array laid out like ENTRIES."""
+    def __init__(self, rsn: str, values: np.ndarray, levels: np.ndarray, fetched_at=None):
+        # XP for skills, score for activities and KC for bosses. Unranked entries are -1.
+        self.rsn = rsn
+        self.values = values
+        # Level in each of SKILLS
+        self.levels = levels
+        # Epoch time the entry was fetched from the highscores, if it wasn't just now
+        self.fetched_at = fetched_at
+
+    def __repr__(self) -> str:
+        return f'HiscoresEntry({self.rsn!r})'
+
+
+"""Number of commas in each row of an index_lite.ws response, in the order of ENTRIES
+"""
+ROW_COMMAS = [2] * len(SKILLS) + [1] * (len(ACTIVITIES) + len(BOSSES))
+
+
+def parse_index_lite(text: str, rsn='') -> HiscoresEntry:
+    """Parses a raw response from the highscores lite API.
+
+    :param text: str body of an index_lite.ws response.
+    :param rsn: String of player's OSRS username, stored on the returned entry.
+    :return: HiscoresEntry holding the player's XP in each of SKILLS followed by their score in each
+    of ACTIVITIES and KC for each of BOSSES.
+    @:raises ValueError if text does not contain exactly one row for every skill, activity and boss,
+    for instance because rows have been added to the highscores that ENTRIES doesn't list yet.
+    """
+    # Skill rows are 'rank,level,xp' and all other rows are 'rank,score', so flattening the
+    # response puts every value at a fixed offset and lets it be converted in one step.
+    n_skill_fields = 3 * len(SKILLS)
+    rows = text.strip().splitlines()
+    if len(rows) != len(ENTRIES):
+        raise ValueError(f'Expected {len(ENTRIES)} highscores rows in response for {rsn}, got {len(rows)}.')
+    if [row.count(',') for row in rows] != ROW_COMMAS:
+        raise ValueError(f'Highscores rows in response for {rsn} are not laid out as expected.')
+
+    fields = np.array(','.join(rows).split(','), dtype=np.int64)
+    values = np.concatenate((fields[2:n_skill_fields:3], fields[n_skill_fields + 1::2]))
+    return HiscoresEntry(rsn, values, fields[1:n_skill_fields:3])
+
+
+"""XP needed for each level from 1 to 99, used to work out levels from XP
+"""
+LEVEL_XP = np.floor(np.cumsum([0] + [np.floor(level + 300 * 2 ** (level / 7)) for level in range(1, 99)]) / 4)
+
+
+def levels_from_xp(values: np.ndarray) -> np.ndarray:
+    """Works out a player's levels from their XP, for entries that were stored without them.
+
+    :param values: np.ndarray of int highscores values laid out like ENTRIES.
+    :return: np.ndarray of int levels in each of SKILLS, with overall being the total level.
+    """
+    levels = np.searchsorted(LEVEL_XP, np.maximum(values[:len(SKILLS)], 0), side='right')
+    levels[0] = levels[1:].sum()
+    return levels
+
+
+class HiscoresUnavailable(Exception):
+    """Raised when the highscores could not be reached or returned an error, as opposed to a
+    player not being listed on them.
+    """
+    pass
+
+
+class HiscoresLayoutError(Exception):
+    """Raised when the highscores responded but the response couldn't be parsed, for instance
+    because rows were added that ENTRIES doesn't list yet. Retrying won't help, so it isn't retried.
+    """
+    pass
+
+
+"""Marker returned by get_users() in place of the entries of a player who could not be fetched
+because of a timeout or server error, even after retrying
+"""
+FETCH_FAILED = 'fetch failed'
+
+"""Rate limiter shared by every highscores request this process makes
+"""
+limiter = AdaptiveRateLimiter()
+
+
+class FetchBreaker:
+    """Decides when to give up on the rest of a group's highscores requests: once
+    HISCORES_DEADLINE seconds have passed, or once the share of failed requests shows the
+    highscores are down.
+    """
+    def __init__(self, deadline=HISCORES_DEADLINE, ratio=HISCORES_BREAKER_RATIO,
+                 min_requests=HISCORES_BREAKER_MIN_REQUESTS):
+        self.deadline = time.monotonic() + deadline
+        self.ratio = ratio
+        self.min_requests = min_requests
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, ok: bool) -> None:
+        """Counts a request that was made, and whether the highscores responded to it."""
+        self.requests += 1
+        if not ok:
+            self.failures += 1
+
+    def tripped(self) -> bool:
+        """Returns True once no more requests should be made."""
+        if time.monotonic() > self.deadline:
+            return True
+        return self.requests >= self.min_requests and self.failures >= self.ratio * self.requests
+
+
+async def _fetch_user(session: aiohttp.ClientSession, url: str, rsn: str, breaker: FetchBreaker):
+    """Fetches and parses a single player's highscores entries using a shared session.
+
+    :param session: aiohttp.ClientSession holding the pooled connections to use.
+    :param url: str URL of the index_lite.ws endpoint to query.
+    :param rsn: String of player's OSRS username.
+    :param breaker: FetchBreaker of the group being fetched, which the request is counted in.
+    :return: HiscoresEntry for the player, None if the player is not on the highscores, or
+    FETCH_FAILED if the breaker tripped before the request could be made.
+    @:raises HiscoresLayoutError if the response couldn't be parsed
+    @:raises HiscoresUnavailable if the request failed for any other reason
     """
-    # If we find a user on the Ironman highscores, we know they're an ironman.
-    # Otherwise, we check to make sure the user exists on the main highscore board
-    # This isn't a great solution but it's really the only way to check an account's status
+    if not await limiter.acquire(give_up=breaker.tripped):
+        return FETCH_FAILED
+    start = time.monotonic()
+    ok = False
     try:
-        user = Highscores(rsn, target='ironman')
-        return True
-    except ValueError:
+        async with session.get(url, params={'player': rsn}) as response:
+            # The highscores respond with a 404 for players that aren't listed
+            if response.status == 404:
+                ok = True
+                return None
+            if response.status != 200:
+                raise HiscoresUnavailable(f'Highscores responded with {response.status} for {rsn}.')
+            text = await response.text()
+        # The highscores did respond, so a response that can't be parsed doesn't count against
+        # the rate limiter
+        ok = True
         try:
-            user = Highscores(rsn)
-            return False
-        except ValueError:
-            raise ValueError
+            return parse_index_lite(text, rsn)
+        except ValueError as err:
+            raise HiscoresLayoutError(f'Unable to parse the highscores response for {rsn}: {err}') from err
+    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+        raise HiscoresUnavailable(f'Request for {rsn} failed: {err!r}') from err
+    finally:
+        limiter.release(ok, time.monotonic() - start)
+        breaker.record(ok)
+
+
+async def _fetch_with_retry(session: aiohttp.ClientSession, url: str, rsn: str, breaker: FetchBreaker):
+    """Fetches a single player, retrying with exponential backoff if the request fails.
+
+    :return: HiscoresEntry for the player, None if the player is not on the highscores, or
+    FETCH_FAILED if every attempt failed or the breaker tripped.
+    @:raises HiscoresLayoutError if the response couldn't be parsed
+    """
+    for attempt in range(HISCORES_RETRIES + 1):
+        if breaker.tripped():
+            break
+        try:
+            return await _fetch_user(session, url, rsn, breaker)
+        except HiscoresUnavailable:
+            if attempt < HISCORES_RETRIES:
+                await asyncio.sleep(HISCORES_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+    return FETCH_FAILED
+
+
+async def get_users_async(rsns: list, board='main', base_url=HISCORES_BASE_URL, connections=FETCH_WORKERS) -> dict:
+    """Fetches highscores entries for a whole group of players, like get_users(), from inside a
+    running event loop such as a Discord bot's. get_users() can't be used there, since it starts an
+    event loop of its own. Requests share the same rate limiter as get_users().
+
+    :param rsns: list of str OSRS usernames.
+    :param board: str key of HISCORES_BOARDS denoting which highscores to query. Defaults to 'main'.
+    :param base_url: str base URL of the highscores. Defaults to HISCORES_BASE_URL set in gph_config.py
+    :param connections: int maximum number of pooled connections to use. Defaults to FETCH_WORKERS
+    set in gph_config.py
+    :return: dict mapping each RSN, in the order given, to its HiscoresEntry, None or FETCH_FAILED,
+    as returned by get_users().
+    """
+    url = f'{base_url}/m={HISCORES_BOARDS[board]}/index_lite.ws'
+    # Connections are kept alive and reused between players, up to the given limit at a time
+    connector = aiohttp.TCPConnector(limit=max(1, connections))
+    timeout = aiohttp.ClientTimeout(total=HISCORES_TIMEOUT)
+    breaker = FetchBreaker()
+    unparseable = set()
+
+    async def fetch(rsn: str):
+        try:
+            return await _fetch_with_retry(session, url, rsn, breaker)
+        except HiscoresLayoutError as err:
+            print(f'{err}\n')
+            unparseable.add(rsn)
+            return FETCH_FAILED
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        fetched = dict(zip(rsns, await asyncio.gather(*[fetch(rsn) for rsn in rsns])))
+
+        # Players that still failed are deferred until the rest of the group is done, by which time
+        # the rate limiter has backed off, and then given one more round of retries. Responses that
+        # couldn't be parsed would fail again, so they aren't. If the breaker has tripped, the
+        # highscores are down and everyone left stays FETCH_FAILED.
+        deferred = [rsn for rsn, entry in fetched.items() if entry is FETCH_FAILED and rsn not in unparseable]
+        if deferred and not breaker.tripped():
+            fetched.update(zip(deferred, await asyncio.gather(*[fetch(rsn) for rsn in deferred])))
+
+    if breaker.tripped() and FETCH_FAILED in fetched.values():
+        print(f'Gave up fetching from the highscores after {breaker.requests} requests, '
+              f'{breaker.failures} of which failed.\n')
+    return fetched
+
+
+def get_users(rsns: list, board='main', base_url=HISCORES_BASE_URL, connections=FETCH_WORKERS) -> dict:
+    """Fetches highscores entries for a whole group of players in one call. Requests are throttled
+    by the shared rate limiter, and requests that fail are retried. If the highscores look to be
+    down (see FetchBreaker), the players not fetched yet are given up on rather than waited for.
+
+    :param rsns: list of str OSRS usernames.
+    :param board: str key of HISCORES_BOARDS denoting which highscores to query. Defaults to 'main'.
+    :param base_url: str base URL of the highscores. Defaults to HISCORES_BASE_URL set in gph_config.py
+    :param connections: int maximum number of pooled connections to use. Defaults to FETCH_WORKERS
+    set in gph_config.py
+    :return: dict mapping each RSN, in the order given, to its HiscoresEntry. Players who are not
+    found on the highscores are mapped to None, and players who could not be fetched are mapped
+    to FETCH_FAILED.
+    @:raises RuntimeError if called from a running event loop. Use get_users_async() there instead.
+    """
+    return asyncio.run(get_users_async(rsns, board, base_url, connections))
 
 
-def get_user(rsn: str) -> Highscores:
+def get_user(rsn: str) -> HiscoresEntry:
     """Fetches a given user's highscores entries.
 
     :param rsn: String of player's OSRS username.
-    :return: Highscores object for given user.
+    :return: HiscoresEntry for given user.
+    @:raises ValueError if player is not found on highscores
+    @:raises HiscoresUnavailable if the highscores could not be reached
+    """
+    user = get_users([rsn])[rsn]
+    if user is None:
+        raise ValueError(f'User {rsn} not found on highscores.')
+    if user is FETCH_FAILED:
+        raise HiscoresUnavailable(f'Unable to fetch user {rsn} from the highscores.')
+    return user
+
+
+def normalize_rsn(rsn: str) -> str:
+    """Normalizes a player's OSRS username so that different spellings of the same name match.
+
+    :param rsn: String of player's OSRS username.
+    :return: str lowercase username with underscores and hyphens treated as spaces.
     """
-    return Highscores(rsn)
+    return rsn.lower().replace('_', ' ').replace('-', ' ').strip()
+
+
+def get_account_types(rsns: list) -> dict:
+    """Looks up the account type of each of a group of players on the highscores.
+
+    :param rsns: list of str OSRS usernames.
+    :return: dict mapping each RSN to a key of HISCORES_BOARDS denoting its account type, None if
+    the player was not found on the highscores, or FETCH_FAILED if any of the lookups failed.
+    """
+    # An account is the most specific type whose board has the same overall XP as the main board.
+    # Accounts that stop being an ironman stay on the ironman boards with stale XP, so they are
+    # picked up as mains once they've gained any XP.
+    mains = get_users(rsns)
+    account_types = {rsn: (entry if entry is None or entry is FETCH_FAILED else 'main')
+                     for rsn, entry in mains.items()}
+    def matching(candidates: list, board: str) -> list:
+        # Returns the candidates whose entry on board matches their main board XP
+        entries = get_users(candidates, board=board)
+        for rsn in candidates:
+            if entries[rsn] is FETCH_FAILED:
+                account_types[rsn] = FETCH_FAILED
+        return [rsn for rsn in candidates if isinstance(entries[rsn], HiscoresEntry)
+                and entries[rsn].values[0] == mains[rsn].values[0]]
+
+    candidates = [rsn for rsn in rsns if account_types[rsn] == 'main']
+    irons = matching(candidates, 'ironman') if candidates else []
+    for rsn in irons:
+        account_types[rsn] = 'ironman'
+
+    # Hardcore and ultimate ironmen are both also on the ironman board, but never on each other's,
+    # so each board is checked against every ironman rather than one after the other
+    for board in ['hardcore_ironman', 'ultimate']:
+        if not irons:
+            break
+        for rsn in matching(irons, board):
+            if account_types[rsn] is not FETCH_FAILED:
+                account_types[rsn] = board
+
+    return account_types
+
+
+class AccountTypeStore:
+    """Persistent cache of players' account types, saved to ACCOUNT_TYPES_NAME as JSON.
+    Entries expire after ACCOUNT_TYPE_TTL_DAYS so that accounts which change type are picked up.
+    """
+    def __init__(self, filename=ACCOUNT_TYPES_NAME, ttl_days=ACCOUNT_TYPE_TTL_DAYS):
+        self.filename = filename
+        self.ttl = ttl_days * 24 * 60 * 60
+        # Maps normalized RSN to [account type, time last checked]
+        self.entries = {}
+        if os.path.exists(filename):
+            with open(filename, 'r') as infile:
+                self.entries = json.load(infile)
+        elif os.path.exists(IRON_DICT_NAME) and os.path.getsize(IRON_DICT_NAME) != 0:
+            # Carry over the old ironmen dictionary, treating its entries as checked when it was last written
+            checked = os.path.getmtime(IRON_DICT_NAME)
+            with open(IRON_DICT_NAME, 'r') as infile:
+                for rsn, iron in literal_eval(infile.read()).items():
+                    self.set(rsn, 'ironman' if iron else 'main', checked)
+
+    def get(self, rsn: str):
+        """Returns the cached account type for a player, or None if it is unknown or has expired."""
+        entry = self.entries.get(normalize_rsn(rsn))
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def is_iron(self, rsn: str):
+        """Returns True if a player is cached as any type of ironman, False if they are cached as a
+        main account, or None if their account type is unknown or has expired.
+        """
+        account_type = self.get(rsn)
+        if account_type is None:
+            return None
+        return account_type != 'main'
+
+    def set(self, rsn: str, account_type: str, checked=None) -> None:
+        """Caches a player's account type."""
+        if account_type not in HISCORES_BOARDS:
+            raise ValueError(f'Account type {account_type} not recognized.')
+        if checked is None:
+            checked = time.time()
+        self.entries[normalize_rsn(rsn)] = [account_type, checked]
+
+    def resolve(self, rsns: list) -> None:
+        """Looks up every player whose account type is unknown or has expired in one batch, then
+        saves the store. Players not found on the highscores, or that couldn't be looked up, are left
+        unknown.
+        """
+        unknown = [rsn for rsn in rsns if self.get(rsn) is None]
+        if not unknown:
+            return
+        for rsn, account_type in get_account_types(unknown).items():
+            if account_type in HISCORES_BOARDS:
+                self.set(rsn, account_type)
+        self.save()
+
+    def save(self) -> None:
+        """Writes the store to file, replacing the old file only once the new one is fully written."""
+        tmpfile = self.filename + '.tmp'
+        with open(tmpfile, 'w') as outfile:
+            json.dump(self.entries, outfile)
+        os.replace(tmpfile, self.filename)
 
 
 def get_target_type(target: str) -> str:
@@ -219,40 +627,47 @@ def get_target_type(target: str) -> str:
         return f'Target {target} not recognized.'
 
 
-# TODO Wrap all of these query methods into one query_entry(user, target, attr='default') method
-def query_skill_xp(user: Highscores, skill: str) -> int:
+def query_entry(user: HiscoresEntry, target: str) -> int:
+    """ Queries any entry listed on user's highscores page.
+
+    :param user: User object for player (as returned by get_user())
+    :param target: String specifying the entry to query (valid values are listed in ENTRIES)
+    :return: int of player's XP, score, or KC for the given entry.
+    """
+    try:
+        return int(user.values[ENTRY_INDEX[target]])
+    except KeyError:
+        print(f'Entry {target} not found!\n')
+        raise AttributeError(target)
+
+
+def query_skill_xp(user: HiscoresEntry, skill: str) -> int:
     """ Queries XP listed on user's highscores page.
     :param user: User object for player (as returned by get_user())
     :param skill: String specifying the skill to query (Typically set as SKILL
     in gph_config.py)
     :return: int of player's XP in given skill.
     """
-    try:
-        skill_entry = user.__getattribute__(skill)
-    except AttributeError:
+    if skill not in SKILLS:
         print(f'Skill {skill} not found!\n')
-        raise
-    else:
-        return int(skill_entry.xp)
+        raise AttributeError(skill)
+    return query_entry(user, skill)
 
 
-def query_skill_level(user: Highscores, skill: str) -> int:
-    """ Queries XP listed on user's highscores page.
+def query_skill_level(user: HiscoresEntry, skill: str) -> int:
+    """ Queries level listed on user's highscores page.
     :param user: User object for player (as returned by get_user())
     :param skill: String specifying the skill to query (Typically set as SKILL
     in gph_config.py)
-    :return: int of player's XP in given skill.
+    :return: int of player's level in given skill.
     """
-    try:
-        skill_entry = user.__getattribute__(skill)
-    except AttributeError:
+    if skill not in SKILLS:
         print(f'Skill {skill} not found!\n')
-        raise
-    else:
-        return int(skill_entry.level)
+        raise AttributeError(skill)
+    return int(user.levels[ENTRY_INDEX[skill]])
 
 
-def query_activity_score(user: Highscores, activity: str) -> int:
+def query_activity_score(user: HiscoresEntry, activity: str) -> int:
     """ Queries activity scores listed on user's highscores page.
 
         :param user: User object for player (as returned by get_user())
@@ -260,16 +675,13 @@ def query_activity_score(user: Highscores, activity: str) -> int:
         are listed in ACTIVITIES)
         :return: int of player's score in given activity.
         """
-    try:
-        activity_entry = user.__getattribute__(activity)
-    except AttributeError:
+    if activity not in ACTIVITIES:
         print(f'Activity {activity} not found!\n')
-        raise
-    else:
-        return int(activity_entry.score)
+        raise AttributeError(activity)
+    return query_entry(user, activity)
 
 
-def query_boss_kc(user: Highscores, boss: str) -> int:
+def query_boss_kc(user: HiscoresEntry, boss: str) -> int:
     """ Queries KC listed on user's highscores page.
 
     :param user: User object for player (as returned by get_user())
@@ -277,20 +689,17 @@ def query_boss_kc(user: Highscores, boss: str) -> int:
     in gph_config.py)
     :return: int of player's KC for given boss.
     """
-    try:
-        boss_entry = user.__getattribute__(boss)
-    except AttributeError:
+    if boss not in BOSSES:
         print(f'Boss {boss} not found!\n')
-        raise
-    else:
-        return int(boss_entry.kills)
+        raise AttributeError(boss)
+    return query_entry(user, boss)
 
 # TODO rewrite all three 'fetch_all' functions to return lists and build the
 # TODO strings they currently return in the calling scripts so that they
 # TODO are more broadly useful. Requires changes to the Clockwork Penguin bot.
 
 
-def fetch_all_skills(rsn: str, user: Highscores) -> str:
+def fetch_all_skills(rsn: str, user: HiscoresEntry) -> str:
     """Writes list of user's XP in all skills to string and returns.
 
     :param rsn: String of player's OSRS username.
@@ -304,7 +713,7 @@ def fetch_all_skills(rsn: str, user: Highscores) -> str:
     return msg
 
 
-def fetch_all_activities(rsn: str, user: Highscores) -> str:
+def fetch_all_activities(rsn: str, user: HiscoresEntry) -> str:
     """Writes list of user's score in all activities to string and returns.
 
     :param rsn: String of player's OSRS username.
@@ -318,7 +727,7 @@ def fetch_all_activities(rsn: str, user: Highscores) -> str:
     return msg
 
 
-def fetch_all_bosses(rsn: str, user: Highscores) -> str:
+def fetch_all_bosses(rsn: str, user: HiscoresEntry) -> str:
     """Writes list of user's KC for all bosses to string and returns.
 
     :param rsn: String of player's OSRS username.
@@ -332,28 +741,42 @@ def fetch_all_bosses(rsn: str, user: Highscores) -> str:
     return msg
 
 
-def get_all_entries(usr: Highscores) -> list:
+def get_all_entries(usr: HiscoresEntry) -> list:
     """Fetches a list of all OSRS highscores entries for user rsn
 
-    :param usr: Highscores object pointing to a given user
+    :param usr: HiscoresEntry for a given user
     :return: list of all entries on a player's OSRS highscores page, with entries that are not
     found being set to zero
     """
-    outlist = []
-    for i in range(len(SKILLS)):
-        xp = query_skill_xp(usr, SKILLS[i])
-        if xp <= 0:
-            xp = 0
-        outlist.append(xp)
-    for i in range(len(ACTIVITIES)):
-        score = query_activity_score(usr, ACTIVITIES[i])
-        if score <= 0:
-            score = 0
-        outlist.append(score)
-    for i in range(len(BOSSES)):
-        kc = query_boss_kc(usr, BOSSES[i])
-        if kc <= 0:
-            kc = 0
-        outlist.append(kc)
+    return np.maximum(usr.values, 0).tolist()
+
+
+def weight_vector(weights: dict) -> np.ndarray:
+    """Compiles a dict of highscores entries and their weights, such as the multi_targets of a
+    multi-target contest, into an array index matched with ENTRIES.
 
-    return outlist
+    :param weights: dict mapping str entries in ENTRIES to int or float weights.
+    :return: np.ndarray of each entry's weight, 0.0 for entries not in weights.
+    @:raises ValueError if any of the entries in weights are not on the highscores
+    """
+    unknown = [entry for entry in weights if entry not in ENTRIES]
+    if unknown:
+        raise ValueError(f'Entries {unknown} not found on the highscores.')
+    vector = np.zeros(len(ENTRIES), dtype=np.float64)
+    for entry, weight in weights.items():
+        vector[ENTRIES.index(entry)] = float(weight)
+    return vector
+
+
+def query_weighted_scores(users: list, weights: np.ndarray) -> np.ndarray:
+    """Scores several players at once as the weighted sum of their highscores entries.
+
+    :param users: list of HiscoresEntry objects to score.
+    :param weights: np.ndarray of weights index matched with ENTRIES, as returned by weight_vector().
+    :return: np.ndarray of each player's score rounded to the nearest int, with entries that are not
+    found counting as zero.
+    """
+    if not users:
+        return np.zeros(0, dtype=np.int64)
+    values = np.maximum(np.stack([usr.values for usr in users]), 0)
+    return np.rint(values @ weights).astype(np.int64)
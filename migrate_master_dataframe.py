@@ -0,0 +1,36 @@
+"""migrate_master_dataframe.py
+Utility script to copy every row of the master dataframe from one storage backend to another,
+such as when changing STORAGE_BACKEND in gph_config.py. Copying from the 'segmented' backend
+includes a legacy master_dataframe.csv. The source backend's files are left untouched.
+
+@:arg backend: str Name of the backend to copy the master dataframe into.
+@:arg --source_backend: str Name of the backend to copy the master dataframe from. Default value: 'segmented'
+
+Example call:
+
+"python migrate_master_dataframe.py 'parquet'"
+"""
+
+import argparse
+from gph_storage.store import BACKENDS, open_store
+from gph_utils.gph_config import LOG_NAME
+from gph_utils.gph_logging import log_message
+
+parser = argparse.ArgumentParser()
+parser.add_argument('backend', type=str, choices=list(BACKENDS), help='Backend to copy the master dataframe into.')
+parser.add_argument('--source_backend', type=str, choices=list(BACKENDS), default='segmented',
+                    help='Backend to copy the master dataframe from.')
+
+args = parser.parse_args()
+
+log_message(f'Migrating master dataframe from {args.source_backend} to {args.backend} storage', log=LOG_NAME)
+
+master_df = open_store(args.source_backend).load()
+# The history being copied is already in the period aggregates
+destination = open_store(args.backend, aggregates=False)
+destination.append(master_df)
+destination.compact()
+
+log_message(f'Migrated {len(master_df.index)} rows to {args.backend} storage', log=LOG_NAME)
+print(f'Migrated {len(master_df.index)} rows to {args.backend} storage. Set STORAGE_BACKEND = \'{args.backend}\' '
+      f'in gph_config.py to start using it.')
@@ -0,0 +1,118 @@
+"""poll_scheduler.py
+Decides which players need to be fetched at each contest update. Players whose highscores have
+changed recently are polled at every update, while players who have been idle for IDLE_AFTER_HOURS
+are only polled every IDLE_POLL_HOURS. Contest starts and ends always poll everyone.
+
+The time each player was last verified against the highscores, and last seen changing, is saved
+to POLL_STATE_NAME so that leaderboards can show how fresh each player's data is.
+"""
+import os
+import time
+import zlib
+import numpy as np
+import pandas as pd
+import hs_wrapper as hs
+
+from gph_utils.gph_config import *
+
+
+def _checksum(values) -> int:
+    """Returns a checksum of a player's highscores values, used to tell whether they've changed."""
+    return zlib.crc32(np.ascontiguousarray(values, dtype=np.int64).tobytes())
+
+
+class PollScheduler:
+    """Per-player polling state, keyed by normalized RSN."""
+    def __init__(self, filename=POLL_STATE_NAME):
+        self.filename = filename
+        # Maps normalized RSN to [last verified, last changed, checksum]
+        self.state = {}
+        if os.path.exists(filename):
+            state_df = pd.read_csv(filename)
+            for row in state_df.itertuples(index=False):
+                self.state[row[0]] = [float(row[1]), float(row[2]), int(row[3])]
+
+    def rebuild(self, master_dataframe: pd.DataFrame) -> None:
+        """Builds the polling state from the snapshots already in the master dataframe, using each
+        player's deltas between consecutive snapshots to find when they were last active.
+
+        :param master_dataframe: pd.DataFrame with columns matching data_updater.master_colnames, as
+        returned by data_updater.load_master_dataframe(), or each player's latest snapshot as returned
+        by gph_storage.latest.LatestSnapshots.read().
+        """
+        if master_dataframe.empty:
+            return
+
+        history = master_dataframe.copy()
+        history['RSN'] = history['RSN'].astype(str).map(hs.normalize_rsn)
+        history = history.sort_values(by=['RSN', 'Timestamp'], kind='mergesort')
+        values = history[hs.ENTRIES]
+
+        # A snapshot counts as a change if any value differs from the player's previous snapshot
+        changed = values.ne(values.groupby(history['RSN']).shift()).any(axis=1)
+        last_verified = history.groupby('RSN')['Timestamp'].max()
+        last_changed = history['Timestamp'].where(changed).groupby(history['RSN']).max()
+        last_rows = history.groupby('RSN').tail(1).set_index('RSN')
+
+        for rsn in last_verified.index:
+            self.state[rsn] = [float(last_verified[rsn]), float(last_changed[rsn]),
+                               _checksum(last_rows.loc[rsn, hs.ENTRIES].to_numpy())]
+
+    def due(self, rsns: list, now=None) -> list:
+        """Returns the players from rsns who should be fetched at this update.
+
+        :param rsns: list of str OSRS usernames.
+        :param now: float epoch time of the update. Defaults to the current time.
+        :return: list of the RSNs from rsns that are due, in the order given.
+        """
+        if now is None:
+            now = time.time()
+        due = []
+        for rsn in rsns:
+            state = self.state.get(hs.normalize_rsn(rsn))
+            # Players that have never been polled, or were active recently, are polled every update
+            if state is None or now - state[1] < IDLE_AFTER_HOURS * 3600:
+                due.append(rsn)
+            elif now - state[0] >= IDLE_POLL_HOURS * 3600:
+                due.append(rsn)
+        return due
+
+    def record(self, rsn: str, entry: hs.HiscoresEntry, now=None) -> None:
+        """Records that a player was verified against the highscores.
+
+        :param rsn: String of player's OSRS username.
+        :param entry: HiscoresEntry fetched for the player.
+        :param now: float epoch time the player was fetched, such as entry.fetched_at for snapshots
+        reused from the snapshot cache. Defaults to the current time.
+        """
+        if now is None:
+            now = time.time()
+        checksum = _checksum(hs.get_all_entries(entry))
+        state = self.state.get(hs.normalize_rsn(rsn))
+        if state is None or state[2] != checksum:
+            self.state[hs.normalize_rsn(rsn)] = [now, now, checksum]
+        else:
+            # A snapshot reused from the cache may be older than the last time the player was verified
+            state[0] = max(state[0], now)
+
+    def last_verified(self, rsn: str):
+        """Returns the epoch time a player was last verified, or None if they never have been."""
+        state = self.state.get(hs.normalize_rsn(rsn))
+        if state is None:
+            return None
+        return state[0]
+
+    def save(self) -> None:
+        """Writes the polling state to file. Other contests may have saved the file since it was
+        loaded, so it's merged with the saved state, keeping whichever entry was verified last.
+        """
+        merged = PollScheduler(self.filename).state if os.path.exists(self.filename) else {}
+        for rsn, state in self.state.items():
+            if rsn not in merged or merged[rsn][0] <= state[0]:
+                merged[rsn] = state
+
+        state_df = pd.DataFrame([[rsn] + state for rsn, state in merged.items()],
+                                columns=['RSN', 'Last verified', 'Last changed', 'Checksum'])
+        tmpfile = self.filename + '.tmp'
+        state_df.to_csv(tmpfile, index=False)
+        os.replace(tmpfile, self.filename)
@@ -0,0 +1,37 @@
+"""rebuild_aggregates.py
+Utility script to rebuild the weekly, monthly and per source aggregates (see gph_storage/aggregates.py)
+and each player's latest snapshot (see gph_storage/latest.py) from the full history in the master
+dataframe. Only needed if they're lost or the master dataframe predates them, since they're otherwise
+updated whenever snapshots are appended.
+
+@:arg --output: str Name of the aggregates database to rebuild. Default value: AGGREGATES_NAME set in gph_config.py
+@:arg --latest_output: str Name of the latest snapshots database to rebuild. Default value: LATEST_STATE_NAME
+set in gph_config.py
+
+Example call:
+
+"python rebuild_aggregates.py --output 'period_aggregates.db' --latest_output 'latest_snapshots.db'"
+"""
+
+import argparse
+from gph_storage.aggregates import PeriodAggregates
+from gph_storage.latest import LatestSnapshots
+from gph_storage.store import open_store
+from gph_utils.gph_config import *
+from gph_utils.gph_logging import log_message
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--output', type=str, default=AGGREGATES_NAME, help='Name of the aggregates database to rebuild.')
+parser.add_argument('--latest_output', type=str, default=LATEST_STATE_NAME,
+                    help='Name of the latest snapshots database to rebuild.')
+
+args = parser.parse_args()
+
+log_message(f'Rebuilding period aggregates in {args.output}', log=LOG_NAME)
+store = open_store(aggregates=False)
+PeriodAggregates(args.output).rebuild(store)
+log_message(f'Rebuilt period aggregates in {args.output}', log=LOG_NAME)
+
+log_message(f'Rebuilding latest snapshots in {args.latest_output}', log=LOG_NAME)
+LatestSnapshots(args.latest_output).rebuild(store)
+log_message(f'Rebuilt latest snapshots in {args.latest_output}', log=LOG_NAME)
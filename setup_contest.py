@@ -2,7 +2,7 @@
 Script for adding a new Gold Partyhat contest to the contest-table file.
 Default values for optional arguments are set in gph_config.py
 
-@:arg target: str in hs.SKILLS, hs.ACTIVITIES, hs.BOSSES, or 'multi' (NYI) denoting the specific target to track.
+@:arg target: str in hs.SKILLS, hs.ACTIVITIES, hs.BOSSES, or 'multi' denoting the specific target to track.
 @:arg title: str The name of the contest.
 @:arg start: str representation of a datetime object in the form '[DD MM YYYY - HH:MM]' to mark the start of the
 contest.
@@ -26,14 +26,22 @@ extension.  Defaults to (title.lower.replace(' ', '-') + '-log'), with any other
 @:arg --interval: int Optional argument to set the interval at which the contest updates, in hours. Default value: 6
 @:arg --silent, -s: bool Optional argument to disable sending of messages to Discord when running contest
 scripts for the duration of the contest. Defaults to False
+@:arg --multi_targets, -m: str JSON object mapping highscores entries to their weights, used with the target 'multi'.
+Each player's score is the weighted sum of those entries.
 
 Example call for a contest:
 
 "python setup_contest.py 'hitpoints' 'My Hitpoints Contest' '[01 12 2022 - 19:00]' '[08 12 2022 - 19:00]' 'group'
 --threshold 50000"
 
+Example call for a multi-target contest:
+
+"python setup_contest.py 'multi' 'Wilderness Bosses' '[01 12 2022 - 19:00]' '[08 12 2022 - 19:00]' 'group'
+--multi_targets '{"callisto": 1, "venenatis": 1, "vet_ion": 1, "chaos_elemental": 0.5}'"
+
 """
 
+import json
 import argparse
 from hashlib import sha1
 from crontab import *
@@ -76,10 +84,9 @@ parser.add_argument('--interval', type=int, default=6, help='The number of hours
 parser.add_argument('-s', '--silent', help='Runs script without sending messages to Discord,'
                                            ' and persists for the whole contest.', action='store_true')
 
-# TODO Multi_targets NYI
-#parser.add_argument('-m', '--multi_targets', type=str, default='{}', help='String representation of a dictionary of '
-#                                                                          'targets and weights to use in conjunction '
-#                                                                          'with the flag -target \'multi\'.')
+parser.add_argument('-m', '--multi_targets', type=str, default='{}', help='JSON object mapping highscores entries to '
+                                                                          'their weights, to use in conjunction '
+                                                                          'with the target \'multi\'.')
 
 # Assign variables from args and use defaults if no value given
 settings = dict()
@@ -114,9 +121,13 @@ else:
     logfile = args.logfile + '.txt'
 settings['logfile'] = logfile
 
-# TODO Temporary workaround, multi_targets NYI
-#settings['multi_targets'] = args.multi_targets
-settings['multi_targets'] = {}
+# Parse the weight of each entry in a multi-target contest, checking they're all on the highscores
+try:
+    settings['multi_targets'] = {entry: float(weight) for entry, weight in json.loads(args.multi_targets).items()}
+    hs.weight_vector(settings['multi_targets'])
+except (ValueError, AttributeError) as err:
+    log_message(f'Unable to parse --multi_targets value {args.multi_targets}: {err}', log=logfile)
+    raise ValueError(f'Unable to parse --multi_targets value {args.multi_targets}: {err}')
 
 if not settings['multi_targets'] and settings['target'] == 'multi':
     log_message('Target value of \'multi\' requires a non-empty dictionary to be passed to the --multi_targets'
@@ -133,7 +144,10 @@ if settings['multi_targets'] and settings['target'] != 'multi':
 target = settings['target']
 mode = ''
 units = ''
-if target in hs.SKILLS:
+if target == 'multi':
+    mode = 'multi'
+    units = 'points'
+elif target in hs.SKILLS:
     mode = 'skill'
     units = 'XP'
 elif target in hs.BOSSES:
@@ -167,7 +181,6 @@ if not settings['contest_id']:
                            + settings['end']).encode('utf-8')).hexdigest())[-9:-1]
     settings['contest_id'] = contest_id
 
-# TODO implement multi_targets
 # TODO add argument verification for mode/units/multi_targets/etc
 
 contest = ContestData(settings)
@@ -0,0 +1,80 @@
+"""snapshot_cache.py
+Local cache of players' highscores snapshots shared between every script that fetches them.
+Each player's newest snapshot is kept by normalized RSN along with when it was fetched, and is
+reused for SNAPSHOT_CACHE_MINUTES after that. When several contests and master dataframe updates run
+close together over overlapping groups, each player is then only fetched from the highscores once.
+Reused snapshots keep the time they were fetched (HiscoresEntry.fetched_at), so the master dataframe
+records when they were actually taken.
+"""
+import time
+import sqlite3
+import numpy as np
+import hs_wrapper as hs
+
+from gph_utils.gph_config import *
+
+
+class SnapshotCache:
+    """Cache of HiscoresEntry snapshots backed by an SQLite file, which lets separate processes
+    running at the same time share it safely.
+    """
+    def __init__(self, filename=SNAPSHOT_CACHE_NAME, window_minutes=SNAPSHOT_CACHE_MINUTES):
+        self.filename = filename
+        self.window = window_minutes * 60
+        self.hits = 0
+        self.misses = 0
+        if self.window > 0:
+            with self._connect() as conn:
+                # Replaces the table used when snapshots were cached in fixed time buckets
+                conn.execute('DROP TABLE IF EXISTS snapshots')
+                conn.execute('CREATE TABLE IF NOT EXISTS fetches (rsn TEXT PRIMARY KEY, fetched REAL, '
+                             'source TEXT, entry_values TEXT, levels TEXT)')
+
+    def _connect(self) -> sqlite3.Connection:
+        # Wait on other processes writing to the cache rather than failing
+        return sqlite3.connect(self.filename, timeout=30)
+
+    def get_many(self, rsns: list) -> dict:
+        """Looks up the snapshots fetched for a group of players within the last window.
+
+        :param rsns: list of str OSRS usernames.
+        :return: dict mapping each RSN with a recent enough snapshot to its HiscoresEntry, with
+        fetched_at set to when it was fetched. Players without one are left out.
+        """
+        if self.window <= 0:
+            self.misses += len(rsns)
+            return {}
+
+        with self._connect() as conn:
+            rows = conn.execute('SELECT rsn, fetched, entry_values, levels FROM fetches WHERE fetched >= ?',
+                                (time.time() - self.window,)).fetchall()
+        cached = {rsn: (fetched, entry_values, levels) for rsn, fetched, entry_values, levels in rows}
+
+        entries = {}
+        for rsn in rsns:
+            row = cached.get(hs.normalize_rsn(rsn))
+            if row is None:
+                continue
+            entries[rsn] = hs.HiscoresEntry(rsn, np.array(row[1].split(','), dtype=np.int64),
+                                            np.array(row[2].split(','), dtype=np.int64), fetched_at=row[0])
+        self.hits += len(entries)
+        self.misses += len(rsns) - len(entries)
+        return entries
+
+    def put_many(self, entries: dict, source_id='') -> None:
+        """Records freshly fetched snapshots, replacing any older ones of the same players.
+
+        :param entries: dict mapping RSNs to HiscoresEntry objects.
+        :param source_id: str identifying the source that fetched the snapshots.
+        """
+        if self.window <= 0 or not entries:
+            return
+
+        now = time.time()
+        rows = [(hs.normalize_rsn(rsn), entry.fetched_at if entry.fetched_at is not None else now, source_id,
+                 ','.join(map(str, entry.values.tolist())), ','.join(map(str, entry.levels.tolist())))
+                for rsn, entry in entries.items()]
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO fetches VALUES (?, ?, ?, ?, ?)', rows)
+            # Snapshots older than the window will never be read again
+            conn.execute('DELETE FROM fetches WHERE fetched < ?', (now - self.window,))
@@ -94,15 +94,9 @@ log_message(f'Starting competition for {mode} {target}, running Gold '
             f'Partyhat {GPH_VERSION}', log=logfile)
 log_message(f'Contest name: {title}, contest ID: {contest_id}', log=logfile)
 
-# Load master_df if it exists as a file, otherwise start with an empty df as master_df.
-if os.path.exists(MASTER_DF_NAME):
-    master_df = pd.read_csv(MASTER_DF_NAME)
-else:
-    master_df = pd.DataFrame(columns=master_colnames)
-
 # Run the start of contest procedure and create the initial contest dataframe.
 contest_df = update_entry(group, mode, target, 'start', update_number,
-                          master_df, logfile, datafile, contest_id)
+                          open_store(), logfile, datafile, contest_id, multi_targets)
 
 n_users = len(contest_df.index)
 
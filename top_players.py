@@ -1,18 +1,30 @@
 """top_players.py
-Script to calculate the top players for XP gained and efficient hours bossed (EHB)
-in a given time period.
+Script to calculate the top players for XP gained, efficient hours bossed (EHB) and
+efficient hours played (EHP) in a given time period.
 
 @:arg source_id: str, used by the calling cron job/bash script to note which updates
 to the master dataframe are relevant for the purposes of this script.
 @:arg period: str used to mark the time period the script is looking at,
 for example 'week', 'month', etc. Just used for text purposes and does not affect the
 calculation
+@:arg --days: int, optional. If given, ranks gains over the last this many days from every
+snapshot in the master dataframe instead of the updates made for source_id.
+@:arg --since: str, optional. If given, ranks gains since this time, in the form "[DD MM YYYY - HH:MM]",
+from every snapshot in the master dataframe instead of the updates made for source_id.
+
+Example calls:
+
+"python top_players.py 'WEEK_0123' 'week'"
+"python top_players.py 'EVENT' 'event' --since '[14 01 2023 - 18:00]'"
 """
 
 import os
 import argparse
 from dotenv import load_dotenv
 from data_updater import *
+from ehp import EHP_SKILLS, calc_ehp_batch
+from gains import gains_between, GainsReport
+from gph_storage.aggregates import PeriodAggregates, source_period
 from gph_utils.gph_config import LOG_NAME
 from gph_utils.gph_logging import log_message
 from webhook_handler import WebhookHandler
@@ -27,6 +39,11 @@ else:
 parser = argparse.ArgumentParser()
 parser.add_argument('source_id', type=str, help='Contest identifier.')
 parser.add_argument('period', type=str, help='Period of time to look at')
+parser.add_argument('--days', nargs='?', default=None, type=int, help='Rank gains over the last this many days '
+                                                                      'instead of the updates for source_id.')
+parser.add_argument('--since', nargs='?', default=None, type=str, help='Rank gains since this time, in the form '
+                                                                       '"[DD MM YYYY - HH:MM]", instead of the '
+                                                                       'updates for source_id.')
 
 args = parser.parse_args()
 source_id = args.source_id
@@ -34,98 +51,134 @@ period = args.period
 
 log_message(f'Running top_players.py for end of {period}, source id {source_id}', log=LOG_NAME)
 
-# Load master_df if it exists as a file, otherwise raise an exception.
-if os.path.exists(MASTER_DF_NAME):
-    master_df = pd.read_csv(MASTER_DF_NAME)
-else:
-    log_message(f'Master dataframe file {MASTER_DF_NAME} not found by top_players.py!', log=LOG_NAME)
-    raise FileNotFoundError(f'Master dataframe file \'{MASTER_DF_NAME}\' not found!')
+signed_kc = pd.SparseDtype('int64', 0)
+aggregates = PeriodAggregates()
+if args.days is not None or args.since is not None:
+    # Measure gains between two times from every snapshot in the master dataframe, whichever
+    # source took them, so no snapshots need to be taken for the period itself.
+    end_time = int(datetime.now().timestamp())
+    if args.since is not None:
+        start_time = int(datetime.strptime(args.since, '[%d %m %Y - %H:%M]').timestamp())
+    else:
+        start_time = end_time - args.days * 86400
+    period_gains, start_values = gains_between(start_time, end_time, start_values=True)
+    start_xp = start_values[EHP_SKILLS]
+    if period_gains.empty:
+        log_message(f'No master dataframe rows found since {start_time} by top_players.py!', log=LOG_NAME)
+        raise FileNotFoundError(f'No master dataframe rows found since {start_time}!')
+elif aggregates.has_start(source_period(source_id), 0):
+    # Read every player's gains for source_id from the period aggregates, rather than scanning the
+    # master dataframe. The gains are cached, so reporting on the same period again reuses them.
+    # Aggregates that only began after update 0 fall through to the master dataframe below.
+    period_gains = GainsReport.for_period(source_period(source_id), aggregates=aggregates).gains
+    start_xp = aggregates.snapshots(source_period(source_id), EHP_SKILLS)[0][EHP_SKILLS]
 
-# If a file caching iron/main status exists, open it and read as a dict. Otherwise create it as an empty file.
-if os.path.exists(IRON_DICT_NAME) and os.path.getsize(IRON_DICT_NAME) != 0:
-    with open(IRON_DICT_NAME, 'r') as iron_file:
-        iron_dict = eval(iron_file.read())
+    # Only players with snapshots from both the first and last update can be ranked
+    complete = ((period_gains['Start update'] == 0)
+                & (period_gains['End update'] == period_gains['End update'].max()))
+    for rsn in period_gains.index[~complete]:
+        log_message(f'Insufficient data available for player {rsn}.', log=LOG_NAME)
+    period_gains = period_gains.loc[complete]
 else:
+    # Load the rows for source_id from the master dataframe, raising an exception if there are none.
+    # Activity scores and boss KC are loaded as sparse columns, since most players have none for most of them.
+    master_df = load_master_dataframe(columns=['Update number', 'Update source', 'RSN'] + hs.ENTRIES,
+                                      sources=[source_id], sparse=True)
+    if master_df.empty:
+        log_message(f'No master dataframe rows found for source {source_id} by top_players.py!', log=LOG_NAME)
+        raise FileNotFoundError(f'No master dataframe rows found for source \'{source_id}\'!')
 
-    iron_file = open(IRON_DICT_NAME, 'w')
-    iron_file.close()
-    iron_dict = dict()
+    # Get maximum value of update_number in master_df for rows where 'Update source' is source_id
+    time_df = master_df.loc[(master_df['Update source'] == source_id)].reset_index(drop=True)
+    last_update = time_df['Update number'].max()
 
+    rsn_array = time_df['RSN'].astype(str).unique()
 
-# Get maximum value of update_number in master_df for rows where 'Update source' is source_id
-time_df = master_df.loc[(master_df['Update source'] == source_id)].reset_index(drop=True)
-last_update = time_df.max()['Update number']
+    # Index each player's first row at the start and end of the period by RSN
+    start_rows = time_df.loc[time_df['Update number'] == 0].drop_duplicates(subset='RSN').set_index('RSN')
+    end_rows = time_df.loc[time_df['Update number'] == last_update].drop_duplicates(subset='RSN').set_index('RSN')
 
-gains_df = pd.DataFrame(columns=['RSN', 'XP gained', 'EHB gained'])
+    # Only players with rows at both the start and end of the period can be ranked
+    ranked = [rsn for rsn in rsn_array if rsn in start_rows.index and rsn in end_rows.index]
+    for rsn in rsn_array:
+        if rsn not in start_rows.index or rsn not in end_rows.index:
+            log_message(f'Insufficient data available for player {rsn}.', log=LOG_NAME)
 
-rsn_array = time_df['RSN'].unique()
-# for each value of rsn in rows with last_update, source_id:
-for rsn in rsn_array:
-    # if rows exist with (rsn, update=0) and (rsn, last_update) pairs:
-    if (((time_df['RSN'] == rsn) & (time_df['Update number'] == 0)).any() &
-            ((time_df['RSN'] == rsn) & (time_df['Update number'] == last_update)).any()):
-        # get overall xp gain
-        start_xp_idx = time_df[(time_df['RSN'] == rsn) & (time_df['Update number'] == 0)].first_valid_index()
-        end_xp_idx = time_df[(time_df['RSN'] == rsn) & (time_df['Update number'] == last_update)].first_valid_index()
-        xp_gained = time_df.at[end_xp_idx, 'overall'] - time_df.at[start_xp_idx, 'overall']
+    # Calculate XP, score and KC gained for every player at once. Values are loaded unsigned, so they're
+    # made signed first in case any decreased. Subtracting sparse columns keeps them sparse, so only the
+    # scores and KC a player has are stored.
+    sparse_entries = hs.ACTIVITIES + hs.BOSSES
+    xp_gained = end_rows.loc[ranked, hs.SKILLS].astype('int64') - start_rows.loc[ranked, hs.SKILLS].astype('int64')
+    kc_gained = (end_rows.loc[ranked, sparse_entries].astype(signed_kc)
+                 - start_rows.loc[ranked, sparse_entries].astype(signed_kc))
+    period_gains = pd.concat([xp_gained, kc_gained], axis=1)
+    start_xp = start_rows.loc[ranked, EHP_SKILLS].astype('int64')
 
-        # Get list of boss KC at start of time period
-        start_list = (time_df.iloc[start_xp_idx].loc['abyssal_sire':'zulrah']).tolist()
-        # Get list of boss KC at end of time period
-        end_list = (time_df.iloc[end_xp_idx].loc['abyssal_sire':'zulrah']).tolist()
+# Top players and group totals of every column reported on
+report = GainsReport(period_gains)
+ranked = period_gains.index.tolist()
+xp_gained = period_gains['overall']
+kc_gained = period_gains[hs.BOSSES]
 
-        kc_gained_list = []
+# Look up the account type of any players that aren't cached yet (or whose cached type has expired)
+# in one batch, so that EHB and EHP can be calculated without any further highscores requests.
+account_types = hs.AccountTypeStore()
+account_types.resolve(ranked)
 
-        # Calculate KC gained for each boss
-        for i in range(len(start_list)):
-            kc_gained_list.append(float(end_list[i] - start_list[i]))
+# Calculate everyone's EHB gained at once from their KC gained and their account type's rates
+ehb_gained = hs.calc_ehb_batch(ranked, kc_gained, account_types=account_types)
 
-        # From array of KC gained, calculate EHB
-
-        # Check cached list of iron/main status to speed things up immensely.
-        if rsn in iron_dict:
-            is_ironman = iron_dict[rsn]
-        else:
-            is_ironman = hs.is_iron(rsn)
-            iron_dict[rsn] = is_ironman
-        ehb_gained = hs.calc_ehb_from_list(rsn, kc_gained_list, is_ironman=is_ironman)
-
-        # add [RSN, delta_overall, delta_ehb] to a DataFrame gains_df
-        gains_df.loc[len(gains_df)] = [rsn, xp_gained, ehb_gained]
-    # Otherwise there's an error to handle here
-    else:
-        log_message(f'Insufficient data available for player {rsn}.', log=LOG_NAME)
-        continue
+# Calculate everyone's EHP gained at once from their XP at the start and end of the period
+start_xp = start_xp.reindex(ranked)
+ehp_gained = calc_ehp_batch(ranked, start_xp, start_xp + period_gains[EHP_SKILLS], account_types=account_types)
 
-with open(IRON_DICT_NAME, 'w') as iron_file:
-    iron_file.write(str(iron_dict))
+gains_df = pd.DataFrame({'RSN': ranked, 'XP gained': xp_gained.to_numpy(), 'EHB gained': ehb_gained,
+                         'EHP gained': ehp_gained})
 
 # sort gains dataframe by XP gained
 gains_df = gains_df.sort_values(by=['XP gained'], ascending=False).reset_index(drop=True)
 
-time_period_number = source_id[-4:-2]
-if time_period_number[1] == '1':
-    if time_period_number[0] == '1':
-        suffix = 'th'
-    else:
-        suffix = 'st'
-elif time_period_number[1] == '2':
-    if time_period_number[0] == '1':
-        suffix = 'th'
+# Describe the time period for the embed titles
+if args.days is not None:
+    time_period = f'the last {args.days} days'
+elif args.since is not None:
+    time_period = f'the period since {datetime.fromtimestamp(start_time).strftime("%d %b %Y")}'
+else:
+    time_period_number = source_id[-4:-2]
+    if time_period_number[1] == '1':
+        if time_period_number[0] == '1':
+            suffix = 'th'
+        else:
+            suffix = 'st'
+    elif time_period_number[1] == '2':
+        if time_period_number[0] == '1':
+            suffix = 'th'
+        else:
+            suffix = 'nd'
+    elif time_period_number[1] == '3':
+        if time_period_number[0] == '1':
+            suffix = 'th'
+        else:
+            suffix = 'rd'
     else:
-        suffix = 'nd'
-elif time_period_number[1] == '3':
-    if time_period_number[0] == '1':
         suffix = 'th'
+    if str(time_period_number)[0] == '0':
+        time_period_number = str(time_period_number)[1:]
+    ordinal_time_period = time_period_number + suffix
+
+    year = '20' + source_id[-2:]
+
+    months = ['January', 'February', 'March', 'April', 'May', 'June',
+              'July', 'August', 'September,' 'October', 'November', 'December']
+    if period == 'month' and ((int(time_period_number) >= 1) and (int(time_period_number) < 13)):
+        time_period = f'{months[int(time_period_number) - 1]} {year}'
     else:
-        suffix = 'rd'
-else:
-    suffix = 'th'
-if str(time_period_number)[0] == '0':
-    time_period_number = str(time_period_number)[1:]
-ordinal_time_period = time_period_number + suffix
+        time_period = f'the {ordinal_time_period} {period} of {year}'
 
-year = '20' + source_id[-2:]
+# Write the top 3 and group total of every skill, activity and boss reported on to a file to send
+report_file = f'{source_id}-top-players.txt'
+with open(report_file, 'w') as file:
+    file.write(report.to_text(f'Top gains for {time_period}'))
 
 top_by_xp = []
 # Get top 3 players and their XP gained
@@ -140,18 +193,19 @@ top_by_ehb = []
 for i in range(3):
     top_by_ehb.append([gains_df.at[i, "RSN"], gains_df.at[i, "EHB gained"]])
 
+# sort gains dataframe by EHP gained
+gains_df = gains_df.sort_values(by=['EHP gained'], ascending=False).reset_index(drop=True)
 
-months = ['January', 'February', 'March', 'April', 'May', 'June',
-          'July', 'August', 'September,' 'October', 'November', 'December']
-if period == 'month' and ((int(time_period_number) >= 1) and (int(time_period_number) < 13)):
-    time_period = months[int(time_period_number) - 1]
-else:
-    time_period = f'the {ordinal_time_period} {period} of'
+top_by_ehp = []
+# Get top 3 players and their EHP gained
+for i in range(3):
+    top_by_ehp.append([gains_df.at[i, "RSN"], gains_df.at[i, "EHP gained"]])
 
 # Build embeds
 embeds = [
         {
-            "title": f"Top XP gained for {time_period} {year}",
+            "title": f"Top XP gained for {time_period}",
+            "description": f"The group gained {report.totals(['overall']).at['overall', 'Total gained']:,} XP in total",
             "fields": [
                 {
                     "name": f":first_place:: {top_by_xp[0][0]}",
@@ -172,7 +226,7 @@ embeds = [
             "color": 6655
         },
         {
-            "title": f"Top EHB gained for {time_period} {year}",
+            "title": f"Top EHB gained for {time_period}",
             "color": 16714507,
             "fields": [
                 {
@@ -191,10 +245,33 @@ embeds = [
                     "inline": "false"
                 }
             ]
+        },
+        {
+            "title": f"Top EHP gained for {time_period}",
+            "color": 3066993,
+            "fields": [
+                {
+                    "name": f":first_place:: {top_by_ehp[0][0]}",
+                    "value": f"{top_by_ehp[0][1]} efficient hours played",
+                    "inline": "false"
+                },
+                {
+                    "name": f":second_place:: {top_by_ehp[1][0]}",
+                    "value": f"{top_by_ehp[1][1]} efficient hours played",
+                    "inline": "false"
+                },
+                {
+                    "name": f":third_place:: {top_by_ehp[2][0]}",
+                    "value": f"{top_by_ehp[2][1]} efficient hours played",
+                    "inline": "false"
+                }
+            ]
         }
     ]
 
 # Send message
 wh = WebhookHandler(hook_url=update_webhook)
 wh.send_embed('', embeds=embeds)
+wh.send_file('', filename=report_file)
+os.remove(report_file)
 log_message(f'Done running top_players.py for source id: {source_id}', log=LOG_NAME)
@@ -29,6 +29,7 @@ import argparse
 from os import remove
 from time import sleep
 from contests import *
+from contest_progress import ContestProgress
 from data_updater import *
 from gph_utils.gph_logging import log_message
 from gph_utils.gph_graphing import make_graph
@@ -95,30 +96,31 @@ log_message(f'Updating contest {title}, contest ID: {contest_id}.', log=logfile)
 update_number += 1
 contest.update_entry('update_number', update_number)
 
-# Load master dataframe from file
-master_df = pd.read_csv(MASTER_DF_NAME)
+# Run the contest update procedure, which appends this update's rows to the master dataframe
+store = open_store()
+contest_df = update_entry(group, mode, target, 'update', update_number, store, logfile,
+                          datafile, contest_id, multi_targets)
 
-# Run the contest update procedure and make copies of both dataframes
-master_df, contest_df = update_entry(group, mode, target, 'update', update_number, master_df, logfile,
-                                     datafile, contest_id)
+# Everyone who has reached the participation threshold so far
+participants = set(contest_participants(contest_df, threshold))
 
-participants = set()
+# Players who were idle may not have been polled at this update, so note how fresh their data is
+scheduler = PollScheduler()
+stale_after = datetime.now().timestamp() - interval * 3600
 
 msg = ''
 fields = []
 
-# TODO See if I can partially wrap creation of the progress file
-# TODO into these next two loops
-# TODO See if I can wrap creation of graph_data into this chunk of code
 # Make a list of the top_n participants
-for i in range(top_n):
-    rsn = contest_df.at[i, 'RSN']
-
-    if contest_df.at[i, 'Gained'] >= threshold:
-        participants.add(rsn)
+for rank, rsn, gained in contest_leaders(contest_df, top_n):
+    verified = scheduler.last_verified(rsn)
+    if verified is not None and verified < stale_after:
+        as_of = f' (as of <t:{int(verified)}:R>)'
+    else:
+        as_of = ''
     fields.append({
-        "name": f"{i + 1}) {rsn}",
-        "value": f'{contest_df.at[i, "Gained"]:,} {units} gained',
+        "name": f"{rank}) {rsn}",
+        "value": f'{gained:,} {units} gained{as_of}',
         "inline": 'false'
     })
 
@@ -132,46 +134,18 @@ embed = [
     }
 ]
 
-# Make a list of all participants outside the top_n who still meet the
-# threshold for participation.
-for i in range(top_n, len(contest_df.index)):
-    gained = contest_df.at[i, 'Gained']
-    if gained >= threshold:
-        rsn = contest_df.at[i, 'RSN']
-        participants.add(rsn)
-    else:
-        break
-
 # Create progress graph to send in Discord
 
-# Collect data on the progress of the top_n in a 2D list
-ranked_users = []
-graph_data = [ranked_users]
-for i in range(top_n):
-    rsn = contest_df.at[i, 'RSN']
-    ranked_users.append(rsn)
-    player_data = []
-    for j in range(update_number + 1):
-        try:
-            row = master_df.loc[(master_df['RSN'] == rsn) & (master_df['Update number'] == j) &
-                                (master_df['Update source'] == contest_id)]
-            player_data.append(row.iloc[0][target])
-        except IndexError:
-            log_message(f'Index error encountered while graphing {rsn} at index {j}')
-            continue
-
-        except (KeyError, ValueError):
-            # Possibly encountered if a player changes names partway through a contest.
-            # TODO handle this a little more robustly
-            log_message(f'A data error was encountered for user {rsn} at update #{j}.\n'
-                        f'This may be the result of a name change.')
-            continue
-
-    start_value = player_data[0]
-    for k in range(len(player_data)):
-        player_data[k] = player_data[k] - start_value
-    graph_data.append(player_data)
-graph_data[0] = ranked_users
+# Collect data on the progress of the top_n in a 2D list from the contest's progress file,
+# which has every player's score at each update.
+ranked_users = contest_df['RSN'].iloc[:top_n].tolist()
+progress = ContestProgress(datafile)
+for rsn in progress.missing(ranked_users):
+    # Possibly encountered if a player changes names partway through a contest.
+    # TODO handle this a little more robustly
+    log_message(f'No data was found while graphing {rsn}.\n'
+                f'This may be the result of a name change.')
+graph_data = progress.graph_data(ranked_users, update_number)
 
 update_list = []
 for i in range(update_number + 1):
@@ -191,12 +165,15 @@ with open(textfile, 'w') as file:
     file.write(f'{title} progress update #{update_number}\n'
                f'------------------------------------------\n')
     file.write(f'Rank: RSN:            {units:>6} gained:\n')
-    for i in range(len(contest_df.index)):
-        rsn = contest_df.at[i, 'RSN']
-        gain = contest_df.at[i, 'Gained']
+    for rank, rsn, gain in contest_leaders(contest_df, len(contest_df.index)):
         if gain <= 0:
             break
-        file.write(f'{i + 1:>3})  {rsn:<12}     {gain:>12,}\n')
+        verified = scheduler.last_verified(rsn)
+        if verified is not None and verified < stale_after:
+            as_of = datetime.fromtimestamp(verified).strftime(' (as of %d %b %H:%M)')
+        else:
+            as_of = ''
+        file.write(f'{rank:>3})  {rsn:<12}     {gain:>12,}{as_of}\n')
 
 log_message(f'Progress file {textfile} created successfully.', log=logfile)
 
@@ -218,9 +195,8 @@ par_srtd = sorted(participants)
 for x in par_srtd:
     msg += x + '\n'
 
-# Save dataframes to file
+# Save contest dataframe to file
 contest_df.to_csv(datafile, index=False)
-master_df.to_csv(MASTER_DF_NAME, index=False)
 
 log_message(f'Contest {contest_id} successfully updated.', log=logfile)
 
@@ -11,7 +11,6 @@ the file extension.
 run on the master dataframe.
 """
 
-import os
 import argparse
 from data_updater import *
 from gph_utils.gph_config import LOG_NAME
@@ -31,29 +30,26 @@ update_number = args.update_number
 
 log_message(f'Updating master dataframe from source {source_id}', log=LOG_NAME)
 
-df = pd.DataFrame(columns=master_colnames)
+batch = SnapshotBatch(update_number, source_id)
 
 with open(group + '.txt') as file:
     users = file.readlines()
     users = [line.rstrip() for line in users]
-    for rsn in users:
-        # Fetch Highscores object for user 'rsn'
-        try:
-            usr = hs.get_user(rsn)
-
+    scheduler = PollScheduler()
+    for rsn, usr in fetch_users(users, source_id, LOG_NAME):
         # If user is not found on the highscores, log this and continue
-        except ValueError:
+        if usr is None:
             log_message(f'User {rsn} not found on highscores', log=LOG_NAME)
             continue
+        if usr is hs.FETCH_FAILED:
+            log_message(f'Unable to fetch user {rsn} from the highscores, skipping', log=LOG_NAME)
+            continue
+        scheduler.record(rsn, usr, now=usr.fetched_at)
 
         # Append a row for user in master dataframe
-        hs_entries = hs.get_all_entries(usr)
-        now = datetime.now()
-        timestamp = now.strftime('[%d %b %Y - %H:%M:%S]')
-        entry_array = [timestamp, update_number, source_id, rsn] + hs_entries
-        df.loc[len(
-            df)] = entry_array
-
-    df.to_csv(MASTER_DF_NAME, mode='a', header=not os.path.exists(MASTER_DF_NAME), index=False)
+        batch.add(rsn, usr)
+
+    scheduler.save()
+    open_store().append(batch.to_dataframe())
 
 log_message(f'Master dataframe successfully updated from source {source_id}', log=LOG_NAME)